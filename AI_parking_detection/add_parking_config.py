@@ -11,6 +11,8 @@ import tkinter as tk
 from tkinter import messagebox, filedialog
 from pathlib import Path
 
+from src.json_io import read_json, write_json_atomic
+
 # --- KONFIGURACJA ŚCIEŻEK (ABSOLUTNE) ---
 BASE_DIR = Path(__file__).resolve().parent
 CONFIG_DIR = BASE_DIR / "config"
@@ -57,19 +59,18 @@ def load_or_create_config():
     """
     if CONFIG_FILE.exists():
         try:
-            with open(CONFIG_FILE, 'r', encoding='utf-8') as f: return json.load(f)
+            return read_json(CONFIG_FILE)
         except: pass
     return {"parking_lots": {}, "processing_params": {"gaussian_blur_kernel": [5, 5]}}
 
 def save_config(config):
     """
-    Zapisuje bieżący stan konfiguracji do pliku JSON.
+    Zapisuje bieżący stan konfiguracji do pliku JSON (atomowo, orjson jeśli dostępny).
 
     Args:
         config (dict): Słownik konfiguracyjny do zapisu.
     """
-    with open(CONFIG_FILE, 'w', encoding='utf-8') as f:
-        json.dump(config, f, indent=4, ensure_ascii=False)
+    write_json_atomic(CONFIG_FILE, config)
 
 def save_last_lot_name(lot_name: str):
     """
@@ -92,19 +93,30 @@ def load_temp_url():
     """
     if TEMP_URL_FILE.exists():
         try:
-            with open(TEMP_URL_FILE, 'r', encoding='utf-8') as f:
-                data = json.load(f)
-                return data.get("url", "")
+            return read_json(TEMP_URL_FILE).get("url", "")
         except: pass
     return ""
 
+def load_temp_scale():
+    """
+    Odczytuje skalę obrazu referencyjnego względem klatek źródła (plik tymczasowy Launchera).
+
+    Returns:
+        float: Skala (1.0, jeśli obraz ma rozmiar klatki lub brak zapisu).
+    """
+    if TEMP_URL_FILE.exists():
+        try:
+            return float(read_json(TEMP_URL_FILE).get("scale", 1.0))
+        except: pass
+    return 1.0
+
 def cleanup_temp_url():
     """Usuwa plik tymczasowy zawierający adres URL źródła."""
     if TEMP_URL_FILE.exists():
         try: os.remove(TEMP_URL_FILE)
         except: pass
 
-def create_parking_lot(config, name, rect_width, rect_height, threshold, image_path, video_path):
+def create_parking_lot(config, name, rect_width, rect_height, threshold, image_path, video_path, source_scale=1.0):
     """
     Tworzy nową sekcję parkingu w głównej konfiguracji i zapisuje zmiany.
 
@@ -116,9 +128,10 @@ def create_parking_lot(config, name, rect_width, rect_height, threshold, image_p
         threshold (int): Próg detekcji pikseli.
         image_path (str): Ścieżka do obrazu referencyjnego.
         video_path (str): Ścieżka do źródła wideo.
+        source_scale (float): Skala obrazu referencyjnego względem klatek wideo (< 1.0 gdy pomniejszony).
 
     Returns:
-        str: Relatywna ścieżka do pliku pozycji .pickle.
+        str: Relatywna ścieżka do pliku pozycji (src/positions_io.py).
     """
     positions_file = f"data/parking_lots/{name}_positions"
     rel_image = make_relative(image_path)
@@ -133,6 +146,9 @@ def create_parking_lot(config, name, rect_width, rect_height, threshold, image_p
         "source_image": rel_image,
         "video_source": rel_video 
     }
+    if source_scale < 1.0:
+        # Pozycje miejsc są w pikselach pomniejszonego obrazu - detektor skaluje klatki tak samo
+        new_lot["source_scale"] = source_scale
     
     config["parking_lots"][name] = new_lot
     save_config(config)
@@ -188,10 +204,9 @@ def gui_config_form(default_name, default_img, existing_names, def_w=50, def_h=1
     calib_w, calib_h = def_w, def_h
     if TEMP_CALIB_FILE.exists():
         try:
-            with open(TEMP_CALIB_FILE, 'r') as f:
-                cdata = json.load(f)
-                calib_w = cdata.get("rect_width", def_w)
-                calib_h = cdata.get("rect_height", def_h)
+            cdata = read_json(TEMP_CALIB_FILE)
+            calib_w = cdata.get("rect_width", def_w)
+            calib_h = cdata.get("rect_height", def_h)
             os.remove(TEMP_CALIB_FILE)
         except: pass
 
@@ -239,12 +254,17 @@ def gui_config_form(default_name, default_img, existing_names, def_w=50, def_h=1
     root.mainloop()
     return result
 
-def main():
-    """Główny punkt wejścia modułu. Zarządza parsowaniem argumentów i procesem zapisu."""
+def main(argv=None):
+    """
+    Główny punkt wejścia modułu. Zarządza parsowaniem argumentów i procesem zapisu.
+
+    Args:
+        argv (list|None): Argumenty wiersza poleceń; None oznacza sys.argv.
+    """
     parser = argparse.ArgumentParser()
     parser.add_argument('--default_name', type=str, default='new_parking')
     parser.add_argument('--image_path', type=str, default='')
-    args = parser.parse_args()
+    args = parser.parse_args(argv)
 
     config = load_or_create_config()
     existing_names = list(config.get("parking_lots", {}).keys())
@@ -252,7 +272,8 @@ def main():
     data = gui_config_form(args.default_name, args.image_path, existing_names)
 
     if data["saved"]:
-        create_parking_lot(config, data["name"], data["w"], data["h"], data["t"], args.image_path, data["vid"])
+        create_parking_lot(config, data["name"], data["w"], data["h"], data["t"], args.image_path, data["vid"],
+                           load_temp_scale())
     else:
         sys.exit(1)
 
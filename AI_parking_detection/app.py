@@ -4,20 +4,27 @@ import time
 import os
 import numpy as np
 import sys
-import json
-import tkinter as tk 
+import queue
+import threading
 from src.parking_classifier import ParkClassifier
 from src.config_manager import ConfigManager
-from src.utils import IMG_DIR, get_direct_youtube_url, OverlayConsole
+from src.json_io import read_json, write_json_atomic
+from src.utils import IMG_DIR, get_direct_youtube_url, get_screen_resolution, OverlayConsole
 
 # Ścieżka bazowa projektu
 BASE_DIR = os.path.dirname(os.path.abspath(__file__))
 CONFIG_FILE = os.path.join(BASE_DIR, "config", "parking_config.json")
 
+# Okno (s), w którym kolejne zapisy konfiguracji są łączone w jeden
+SAVE_DEBOUNCE_S = 0.5
+# Czas oczekiwania na klawisz (ms), gdy obraz się nie zmienia (pauza, analiza obrazu) - ok. 30 Hz
+UI_WAIT_MS = 30
+
 class ParkingMonitor:
-    def __init__(self, parking_lot_name: str = "default"):
+    def __init__(self, parking_lot_name: str = "default", config_manager: ConfigManager = None):
         self.lot_name = parking_lot_name
-        self.config_manager = ConfigManager()
+        # Wywołujący może przekazać już wczytaną konfigurację, zamiast parsować ją ponownie
+        self.config_manager = config_manager if config_manager is not None else ConfigManager()
         self.lot_config = self.config_manager.get_parking_lot_config(parking_lot_name)
         
         # --- FIX: Naprawa ścieżki do pliku pozycji ---
@@ -42,12 +49,13 @@ class ParkingMonitor:
         )
         print(f"Monitor: {self.lot_config['name']} | Miejsca: {len(self.classifier.car_park_positions)}")
 
+        # --- ZAPIS W TLE: kolejka + wątek, żeby 'W' nie zatrzymywało pętli wideo ---
+        # Wątek startuje przy pierwszym zapisie, a flush_config_save go zatrzymuje (None w kolejce)
+        self._save_q = queue.Queue()
+        self._save_thread = None
+
     def get_screen_resolution(self):
-        try:
-            root = tk.Tk(); root.withdraw()
-            w, h = root.winfo_screenwidth(), root.winfo_screenheight()
-            root.destroy(); return w, h
-        except: return 1920, 1080 
+        return get_screen_resolution()
 
     def calculate_optimal_scale(self, frame_w, frame_h):
         screen_w, screen_h = self.get_screen_resolution()
@@ -119,10 +127,54 @@ class ParkingMonitor:
         except: pass
 
     def save_current_config(self, threshold, block, c, blur):
-        """Zapisuje parametry suwaków do pliku JSON w odpowiednie miejsca."""
+        """Kolejkuje zapis parametrów suwaków (wykonywany w wątku w tle)."""
+        if self._save_thread is None:
+            self._save_thread = threading.Thread(target=self._save_worker, daemon=True)
+            self._save_thread.start()
+        # Odrzucamy zapis, który jeszcze czeka - liczy się tylko najnowszy
+        while not self._save_q.empty():
+            try:
+                self._save_q.get_nowait()
+                self._save_q.task_done()
+            except queue.Empty:
+                break
         try:
-            with open(CONFIG_FILE, 'r', encoding='utf-8') as f:
-                data = json.load(f)
+            self._save_q.put_nowait((threshold, block, c, blur))
+            return True
+        except queue.Full:
+            return False
+
+    def _save_worker(self):
+        """
+        Wątek zapisu: łączy zapisy z okna SAVE_DEBOUNCE_S i zapisuje tylko ostatni.
+        None w kolejce zapisuje zaległy stan od razu (bez czekania na okno) i kończy wątek.
+        """
+        while True:
+            payload = self._save_q.get()
+            pending = 1
+            stop = payload is None
+            while not stop:
+                try:
+                    item = self._save_q.get(timeout=SAVE_DEBOUNCE_S)
+                except queue.Empty:
+                    break
+                pending += 1
+                if item is None:
+                    stop = True
+                else:
+                    payload = item
+            if payload is not None and not self._do_save(payload):
+                print("[ERROR] Błąd zapisu")
+            for _ in range(pending):
+                self._save_q.task_done()
+            if stop:
+                return
+
+    def _do_save(self, payload):
+        """Zapisuje parametry suwaków do pliku JSON w odpowiednie miejsca (atomowo)."""
+        threshold, block, c, blur = payload
+        try:
+            data = read_json(CONFIG_FILE)
             
             # 1. Zapis Threshold do konkretnego parkingu ("rynek")
             if self.lot_name in data["parking_lots"]:
@@ -135,13 +187,21 @@ class ParkingMonitor:
             data["processing_params"]["gaussian_blur_kernel"] = [blur, blur]
             print(f"[SAVE] Zapisano parametry przetwarzania (Block={block}, C={c}, Blur={blur})")
             
-            with open(CONFIG_FILE, 'w', encoding='utf-8') as f:
-                json.dump(data, f, indent=4)
+            # Ten sam format (wcięcie 2, UTF-8) co zapisy Launchera i add_parking_config
+            write_json_atomic(CONFIG_FILE, data)
             return True
         except Exception as e:
             print(f"Błąd zapisu: {e}")
             return False
 
+    def flush_config_save(self):
+        """Zapisuje zaległe zmiany i zatrzymuje wątek zapisu (wywoływane przy wyjściu)."""
+        if self._save_thread is None:
+            return
+        self._save_q.put(None)
+        self._save_thread.join()
+        self._save_thread = None
+
     def monitor_video(self, video_source: str = None, output_path: str = None, user_scale_percent: int = 100, duration_minutes: float = 0.0):
         if video_source is None: 
             video_source = self.lot_config["video_source"]
@@ -166,8 +226,10 @@ class ParkingMonitor:
             print(f"[FATAL] Nie można otworzyć źródła wideo: {video_source}")
             return
         
-        orig_w = int(cap.get(cv2.CAP_PROP_FRAME_WIDTH))
-        orig_h = int(cap.get(cv2.CAP_PROP_FRAME_HEIGHT))
+        # Obraz referencyjny mógł zostać pomniejszony przy pobieraniu - klatki skalujemy do jego rozmiaru
+        source_scale = float(self.lot_config.get("source_scale", 1.0))
+        orig_w = int(cap.get(cv2.CAP_PROP_FRAME_WIDTH) * source_scale)
+        orig_h = int(cap.get(cv2.CAP_PROP_FRAME_HEIGHT) * source_scale)
         
         if user_scale_percent == 100: scale_factor = self.calculate_optimal_scale(orig_w, orig_h)
         else: scale_factor = user_scale_percent / 100.0
@@ -187,7 +249,10 @@ class ParkingMonitor:
         console = OverlayConsole(title=f"LOG: {self.lot_config['name']}", visible_by_default=False)
         sys.stdout = console 
         
-        ui_state = {'should_quit': False, 'btn_rect': (0,0,0,0)}
+        # Geometria przycisku zależy tylko od rozmiaru okna - liczona raz, przed pętlą
+        btn_w, btn_h = 100, 30
+        btn_x, btn_y = disp_w - btn_w - 10, 10
+        ui_state = {'should_quit': False, 'btn_rect': (btn_x, btn_y, btn_w, btn_h)}
 
         def mouse_callback(event, x, y, flags, param):
             console.handle_mouse(event, x, y, flags)
@@ -209,6 +274,9 @@ class ParkingMonitor:
         end_time = start_time + (duration_minutes * 60) if duration_minutes > 0.0 else float('inf')
         paused = False
         frame_count = 0
+        # Wynik detekcji ostatniej klatki - używany ponownie, gdy nic się nie zmieniło (pauza)
+        last_result_key = None
+        processed = annotated = stats = None
         
         try:
             while True:
@@ -237,10 +305,22 @@ class ParkingMonitor:
                         print("[INFO] Pętla wideo...")
                         cap.set(cv2.CAP_PROP_POS_FRAMES, 0)
                         continue
+                    if source_scale < 1.0:
+                        frame = cv2.resize(frame, (orig_w, orig_h), interpolation=cv2.INTER_AREA)
                     frame_count += 1
                 
-                processed = self.classifier.implement_process(frame)
-                annotated, stats = self.classifier.classify(frame.copy(), processed, current_thresh_limit)
+                params = self.classifier.processing_params
+                result_key = (frame_count, current_thresh_limit, tuning_active,
+                              params["adaptive_threshold_block_size"], params["adaptive_threshold_c"],
+                              tuple(params["gaussian_blur_kernel"]))
+                if result_key != last_result_key:
+                    # Podgląd tuningu potrzebuje pełnej klatki, detekcja tylko obszaru miejsc
+                    if tuning_active:
+                        processed = self.classifier.implement_process(frame)
+                    else:
+                        processed = self.classifier.implement_process_roi(frame)
+                    annotated, stats = self.classifier.classify(frame.copy(), processed, current_thresh_limit)
+                    last_result_key = result_key
                 
                 display_frame = cv2.resize(annotated, (disp_w, disp_h), interpolation=cv2.INTER_AREA)
 
@@ -254,10 +334,6 @@ class ParkingMonitor:
                 cv2.putText(display_frame, info_text, (10, disp_h-10), cv2.FONT_HERSHEY_SIMPLEX, 0.6, (255,255,255), 1)
 
                 # PRZYCISK ZAMKNIJ
-                btn_w, btn_h = 100, 30
-                btn_x, btn_y = disp_w - btn_w - 10, 10
-                ui_state['btn_rect'] = (btn_x, btn_y, btn_w, btn_h)
-                
                 cv2.rectangle(display_frame, (btn_x, btn_y), (btn_x+btn_w, btn_y+btn_h), (0,0,180), -1)
                 cv2.rectangle(display_frame, (btn_x, btn_y), (btn_x+btn_w, btn_y+btn_h), (200,200,200), 1)
                 cv2.putText(display_frame, "WYJSCIE", (btn_x+15, btn_y+20), cv2.FONT_HERSHEY_SIMPLEX, 0.5, (255,255,255), 1)
@@ -272,7 +348,8 @@ class ParkingMonitor:
 
                 if writer: writer.write(display_frame)
                 
-                key = cv2.waitKey(1) & 0xFF
+                # Odtwarzanie wymaga szybkiego tempa, pauza tylko odświeżania UI
+                key = cv2.waitKey(UI_WAIT_MS if paused else 1) & 0xFF
                 if key == ord('q'): break
                 elif key == ord('h'): 
                     console.toggle()
@@ -296,9 +373,7 @@ class ParkingMonitor:
                 # --- ZAPIS (W) - Tylko gdy Tuning aktywny ---
                 elif tuning_active and key == ord('w'):
                     th, bs, c, bk = self.get_trackbar_values(tuning_win)
-                    if self.save_current_config(th, bs, c, bk):
-                        pass # Komunikat jest wewnątrz save_current_config
-                    else:
+                    if not self.save_current_config(th, bs, c, bk):
                         print("[ERROR] Błąd zapisu")
                 
                 elif tuning_active and key == ord('r'):
@@ -307,6 +382,7 @@ class ParkingMonitor:
         except KeyboardInterrupt: pass
         finally:
             sys.stdout = sys.__stdout__
+            self.flush_config_save()
             cap.release()
             if writer: writer.release()
             cv2.destroyAllWindows()
@@ -324,7 +400,7 @@ class ParkingMonitor:
         scale_factor = self.calculate_optimal_scale(orig_w, orig_h) if scale_percent == 100 else scale_percent/100.0
         disp_w, disp_h = int(orig_w * scale_factor), int(orig_h * scale_factor)
 
-        processed = self.classifier.implement_process(image)
+        processed = self.classifier.implement_process_roi(image)
         annotated, stats = self.classifier.classify(image.copy(), processed, self.lot_config["threshold"])
         display = cv2.resize(annotated, (disp_w, disp_h), interpolation=cv2.INTER_AREA)
         
@@ -339,11 +415,15 @@ class ParkingMonitor:
         def mouse_cb(event, x, y, flags, param): console.handle_mouse(event, x, y, flags)
         cv2.setMouseCallback(win_name, mouse_cb)
 
+        # Obraz jest statyczny - przerysowujemy tylko po zmianie stanu konsoli
+        drawn_revision = None
         while True:
-            frame_copy = display.copy()
-            frame_copy = console.draw(frame_copy)
-            cv2.imshow(win_name, frame_copy)
-            k = cv2.waitKey(20) & 0xFF
+            if console.revision != drawn_revision:
+                drawn_revision = console.revision
+                frame_copy = display.copy()
+                frame_copy = console.draw(frame_copy)
+                cv2.imshow(win_name, frame_copy)
+            k = cv2.waitKey(UI_WAIT_MS) & 0xFF
             if k == ord('q'): break
             elif k == ord('h'): console.toggle()
         
@@ -361,7 +441,7 @@ class ParkingMonitor:
         pass
     
 
-def main():
+def main(argv=None):
     parser = argparse.ArgumentParser()
     parser.add_argument('--lot', '-l', default='default')
     parser.add_argument('--mode', '-m', choices=['video', 'image'], default='video')
@@ -377,7 +457,7 @@ def main():
     parser.add_argument('--threshold_block', type=int)
     parser.add_argument('--threshold_c', type=int)
     
-    args = parser.parse_args()
+    args = parser.parse_args(argv)
     
     try:
         monitor = ParkingMonitor(args.lot)
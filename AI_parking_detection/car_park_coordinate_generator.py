@@ -1,58 +1,114 @@
 import cv2
-import pickle
 import sys
 import os
 import argparse
 import numpy as np
 import json
 import time
-import tkinter as tk
-from src.utils import OverlayConsole, draw_text_pl
+import functools
+import threading
+from src.utils import OverlayConsole, blend_rects, draw_text_pl, get_screen_resolution
+from src.positions_io import load_positions, save_positions
+from src.json_io import read_json
+from src.kernels import points_in_polygons, rotated_rect_corners
 
 # --- KONFIGURACJA ---
 BASE_DIR = os.path.dirname(os.path.abspath(__file__))
 POLYGON_DIR = os.path.join(BASE_DIR, "data", "parking_lots")
 CONFIG_FILE = os.path.join(BASE_DIR, "config", "parking_config.json")
 TEMP_CALIB_FILE = os.path.join(BASE_DIR, "config", "temp_calibration.json")
+# Okres mrugania kursora w polu edycji ID (s) i domyślny czas oczekiwania na klawisz (ms)
+BLINK_INTERVAL_S = 0.5
+UI_WAIT_MS = 10
+# Czas oczekiwania (ms), gdy od ostatniej klatki nic się nie zmieniło
+UI_IDLE_WAIT_MS = 30
 
 def get_positions_file(lot_name):
     os.makedirs(POLYGON_DIR, exist_ok=True)
     return os.path.join(POLYGON_DIR, f"{lot_name}_positions")
 
-def load_config_dims(lot_name):
-    if os.path.exists(CONFIG_FILE):
-        try:
-            with open(CONFIG_FILE, 'r', encoding='utf-8') as f:
-                data = json.load(f)
-                lot = data.get("parking_lots", {}).get(lot_name)
-                if lot: 
-                    return int(lot.get("rect_width", 50)), int(lot.get("rect_height", 100))
-        except: pass
-    return 50, 100
+# Sparsowany plik konfiguracyjny i jego mtime - ponowny odczyt tylko po zmianie pliku
+_config_cache = {'mtime': None, 'data': {}}
 
-def get_image_path_from_config(lot_name):
-    if os.path.exists(CONFIG_FILE):
-        try:
-            with open(CONFIG_FILE, 'r', encoding='utf-8') as f:
-                data = json.load(f)
-                lot = data.get("parking_lots", {}).get(lot_name)
-                if lot:
-                    src = lot.get("source_image", "")
-                    if src and not os.path.isabs(src):
-                        return os.path.join(BASE_DIR, src)
-                    return src
-        except: pass
-    return None
-
-def get_screen_resolution():
+def load_parking_config():
+    """Zwraca sparsowany plik konfiguracyjny. Koszt wywołania przy niezmienionym pliku to jeden stat."""
     try:
-        root = tk.Tk(); root.withdraw()
-        w, h = root.winfo_screenwidth(), root.winfo_screenheight()
-        root.destroy(); return w, h
-    except: return 1920, 1080
+        mtime = os.stat(CONFIG_FILE).st_mtime
+    except OSError:
+        return {}
+    if mtime != _config_cache['mtime']:
+        try:
+            _config_cache['data'] = read_json(CONFIG_FILE)
+        except: _config_cache['data'] = {}
+        _config_cache['mtime'] = mtime
+    return _config_cache['data']
+
+def load_lot_config(lot_name):
+    """Zwraca sekcję parkingu z pliku konfiguracyjnego lub None."""
+    return load_parking_config().get("parking_lots", {}).get(lot_name)
+
+def load_lot_settings(lot_name):
+    """
+    Zwraca (rect_w, rect_h, ścieżka obrazu) parkingu z jednego odczytu konfiguracji.
+    Brakujące wymiary zastępowane są wartościami domyślnymi 50 x 100, brak obrazu to None.
+    """
+    lot = load_lot_config(lot_name)
+    if not lot: return 50, 100, None
+    try: w, h = int(lot.get("rect_width", 50)), int(lot.get("rect_height", 100))
+    except: w, h = 50, 100
+    src = lot.get("source_image", "")
+    if src and not os.path.isabs(src):
+        src = os.path.join(BASE_DIR, src)
+    return w, h, src
+
+class PointBuffer:
+    """
+    Lista punktów (x, y) trzymana w prealokowanej tablicy int32 z licznikiem długości.
+    Dodawanie i cofanie tylko przesuwa licznik, a `array` jest widokiem bez kopii -
+    gotowym do skalowania i cv2.polylines. Pełny bufor podwaja pojemność.
+    """
+    __slots__ = ('buf', 'n', 'revision')
+
+    def __init__(self, capacity):
+        self.buf = np.empty((capacity, 2), np.int32)
+        self.n = 0
+        # Licznik zmian - klucz dla danych podręcznych liczonych z zawartości bufora
+        self.revision = 0
+
+    @property
+    def array(self):
+        return self.buf[:self.n]
+
+    def append(self, pt):
+        if self.n == len(self.buf):
+            self.buf = np.concatenate((self.buf, np.empty_like(self.buf)))
+        self.buf[self.n] = pt
+        self.n += 1; self.revision += 1
+
+    def extend(self, pts):
+        for pt in pts: self.append(pt)
+
+    def pop(self):
+        self.n -= 1; self.revision += 1
+        return tuple(self.buf[self.n].tolist())
+
+    def clear(self):
+        self.n = 0; self.revision += 1
+
+    def tolist(self):
+        return [tuple(p) for p in self.array.tolist()]
+
+    def __len__(self):
+        return self.n
+
+    def __getitem__(self, i):
+        return tuple(self.array[i].tolist())
+
+    def __iter__(self):
+        return iter(self.tolist())
 
 # --- ZMIENNE STANU ---
-car_park_positions = []; route_points = []; temp_points = []
+car_park_positions = []; route_points = PointBuffer(1024); temp_points = PointBuffer(4)
 mode = 'p'; console_ui = None; scale_factor = 1.0
 rect_w, rect_h = 50, 100; current_angle = 0; input_buffer = ""; is_editing_id = False
 edit_target_index = -1; blink_state = True; mouse_curr_x, mouse_curr_y = 0, 0
@@ -62,6 +118,29 @@ ui_force_hidden = False
 show_help_panel = False 
 positions_file = "" 
 last_h_press_time = 0 
+needs_redraw = True 
+# Podgląd prostokąta pod kursorem - przeliczany tylko po ruchu myszy, obrocie lub zmianie wymiarów
+preview_cache = {'key': None, 'pts': None}
+# Siatka przestrzenna do trafień kliknięciem: (kx, ky) -> indeksy miejsc; None = do przebudowy
+spot_grid = {'cell': 1, 'cells': None, 'pts': None, 'bbox': None, 'label_w': 0}
+# Panel pomocy (stała treść) - renderowany raz, potem tylko nakładany
+HELP_PANEL_X, HELP_PANEL_Y, HELP_PANEL_W, HELP_PANEL_H = 10, 45, 220, 350
+help_panel_cache = {'plain': None, 'sprite': None, 'mask': None}
+# Trasa przeskalowana do okna, przeliczana tylko po jej zmianie
+route_cache = {'key': None, 'pts': None}
+# --- RENDEROWANIE W TLE ---
+# state_lock chroni stan edytora współdzielony przez callbacki okna (wątek główny) i wątek
+# renderujący; front_lock chroni wymianę gotowej klatki i jej wyświetlanie
+state_lock = threading.RLock()
+front_lock = threading.Lock()
+render_request = threading.Event()
+render_state = {'front': None, 'pending': False, 'stop': False}
+# Zapas (px) wokół geometrii przy przywracaniu tła - grubość linii i etykiety ID
+# (minimum; przy dłuższych etykietach zapas rośnie do szerokości najdłuższej z nich)
+DIRTY_PAD = 80
+# Czcionki (krój, skala, grubość) etykiet ID miejsc i tekstu w oknie edycji ID
+LABEL_FONT = (0, 0.5, 2)
+ID_EDIT_FONT = (0, 1.2, 3)
 
 
 def get_next_id():
@@ -70,23 +149,252 @@ def get_next_id():
     while cand in existing: cand += 1
     return str(cand)
 
+def spot_points_np(spot):
+    """
+    Zwraca punkty miejsca jako tablicę int32 (N, 2). Tablica jest liczona raz i trzymana
+    w słowniku pod kluczem '_pts_np' (klucze z '_' nie trafiają do pliku pozycji).
+    """
+    pts = spot.get('_pts_np')
+    if pts is None:
+        pts = spot['_pts_np'] = np.asarray(spot['points'], dtype=np.int32)
+    return pts
+
+def _spot_disp(spot):
+    """Współrzędne okna miejsca: (skala, punkty int32 (N, 1, 2), pozycja etykiety ID), raz na skalę."""
+    cached = spot.get('_pts_disp')
+    if cached is None or cached[0] != scale_factor:
+        pts = (spot_points_np(spot) * scale_factor).astype(np.int32).reshape(-1, 1, 2)
+        cx, cy = spot_centroid(spot)
+        cached = spot['_pts_disp'] = (scale_factor, pts, (int(cx*scale_factor), int(cy*scale_factor)))
+    return cached
+
+def spot_points_disp(spot):
+    """Punkty miejsca przeskalowane do okna, int32 (N, 1, 2), liczone raz na skalę ('_pts_disp')."""
+    return _spot_disp(spot)[1]
+
+def spot_label_disp(spot):
+    """Pozycja etykiety ID miejsca (środek) we współrzędnych okna."""
+    return _spot_disp(spot)[2]
+
+def spot_centroid(spot):
+    """Zwraca środek miejsca (średnia wierzchołków, w pikselach oryginału), liczony raz ('_centroid')."""
+    c = spot.get('_centroid')
+    if c is None:
+        cx, cy = spot_points_np(spot).mean(axis=0)
+        c = spot['_centroid'] = (float(cx), float(cy))
+    return c
+
+def invalidate_spot_grid():
+    """Oznacza siatkę trafień jako nieaktualną (po dodaniu/usunięciu miejsc)."""
+    spot_grid['cells'] = None
+    spot_grid['bbox'] = None
+
+def spot_at(x, y):
+    """
+    Zwraca indeks pierwszego miejsca zawierającego punkt (x, y) lub -1.
+    Test punktu w wielokącie wykonywany jest tylko dla miejsc, których obrys
+    (bounding box) przecina komórkę siatki z klikniętym punktem.
+    """
+    if spot_grid['cells'] is None:
+        cell = max(int(rect_w), int(rect_h), 1)
+        cells = {}
+        for i, p in enumerate(car_park_positions):
+            pts = spot_points_np(p)
+            (x0, y0), (x1, y1) = pts.min(axis=0) // cell, pts.max(axis=0) // cell
+            for gx in range(int(x0), int(x1) + 1):
+                for gy in range(int(y0), int(y1) + 1):
+                    cells.setdefault((gx, gy), []).append(i)
+        spot_grid['cell'], spot_grid['cells'] = cell, cells
+        # Tablica (N, V, 2) dla testu wektorowego - tylko gdy wszystkie miejsca mają tyle samo wierzchołków
+        shapes = {spot_points_np(p).shape for p in car_park_positions}
+        spot_grid['pts'] = (np.stack([spot_points_np(p) for p in car_park_positions]).astype(np.float64)
+                            if len(shapes) == 1 else None)
+
+    cell = spot_grid['cell']
+    candidates = spot_grid['cells'].get((x // cell, y // cell), ())
+    if not candidates: return -1
+    if spot_grid['pts'] is not None:
+        inside = points_in_polygons(x, y, spot_grid['pts'][candidates])
+        hits = np.flatnonzero(inside)
+        return candidates[hits[0]] if hits.size else -1
+    for i in candidates:
+        if cv2.pointPolygonTest(spot_points_np(car_park_positions[i]), (x, y), False) >= 0:
+            return i
+    return -1
+
+def help_panel_sprite():
+    """
+    Renderuje panel pomocy raz i zwraca (tło panelu, panel z tekstem, maska tekstu).
+    Tło jest co klatkę mieszane z obrazem (85%), a piksele tekstu kopiowane na wierzch.
+    """
+    if help_panel_cache['sprite'] is None:
+        pw, ph = HELP_PANEL_W, HELP_PANEL_H
+        plain = np.zeros((ph + 1, pw + 1, 3), np.uint8)
+        cv2.rectangle(plain, (0, 0), (pw, ph), (20, 20, 20), -1)
+        cv2.rectangle(plain, (0, 0), (pw, ph), (100, 100, 100), 1)
+        sprite = plain.copy()
+        sprite = draw_text_pl(sprite, "SKRÓTY KLAWISZOWE", (30, 15), 0.5, (0, 255, 255))
+        cv2.line(sprite, (10, 35), (pw-10, 35), (100,100,100), 1)
+        help_list = [("TRYBY:", ""), (" [P]", "Dodaj Prostokąt"), (" [I]", "Dodaj Wielokąt (4 pkt)"), (" [T]", "Rysuj Trasę"), (" [E]", "Edytuj ID miejsca"),
+                     ("AKCJE:", ""), (" [R]", "Resetuj wszystko"), (" [S]", "Zapisz zmiany"), (" [H]", "Pokaż/Ukryj print"), (" [Q]", "Wyjdź"), (" [U]", "Ukryj interfejs")]
+        curr_y = 55
+        for k_txt, desc in help_list:
+            if desc == "": sprite = draw_text_pl(sprite, k_txt, (10, curr_y), 0.45, (150,150,150)); curr_y += 25
+            else: sprite = draw_text_pl(sprite, k_txt, (10, curr_y), 0.45, (0,255,0)); sprite = draw_text_pl(sprite, desc, (50, curr_y), 0.45, (220,220,220)); curr_y += 25
+        help_panel_cache['plain'] = plain
+        help_panel_cache['sprite'] = sprite
+        help_panel_cache['mask'] = (sprite != plain).any(axis=2, keepdims=True)
+    return help_panel_cache['plain'], help_panel_cache['sprite'], help_panel_cache['mask']
+
+def scaled_route():
+    """
+    Zwraca punkty trasy przeskalowane do okna jako tablicę int32 (N, 2),
+    przeliczaną tylko po zmianie trasy (licznik zmian bufora) lub skali.
+    """
+    key = (route_points.revision, scale_factor)
+    if key != route_cache['key']:
+        route_cache['key'] = key
+        route_cache['pts'] = (route_points.array * scale_factor).astype(np.int32)
+    return route_cache['pts']
+
+def spots_bbox():
+    """
+    Obrys (x0, y0, x1, y1) wszystkich miejsc w pikselach oryginału, przeliczany po zmianie miejsc
+    lub ich ID. Przy okazji zapamiętuje szerokość najdłuższej etykiety ID ('label_w', px okna).
+    """
+    if spot_grid['bbox'] is None and car_park_positions:
+        allp = np.concatenate([spot_points_np(p) for p in car_park_positions])
+        (x0, y0), (x1, y1) = allp.min(axis=0), allp.max(axis=0)
+        spot_grid['bbox'] = (int(x0), int(y0), int(x1), int(y1))
+        font, font_scale, thickness = LABEL_FONT
+        spot_grid['label_w'] = max(cv2.getTextSize(str(p['id']), font, font_scale, thickness)[0][0]
+                                   for p in car_park_positions)
+    return spot_grid['bbox']
+
+def id_edit_rect(dw, dh):
+    """
+    Obszar (x0, y0, x1, y1) okna edycji ID razem z wpisywanym tekstem, który przy długim
+    ID wychodzi poza ramkę (tekst zaczyna się w cx-50, a bufor nie ma limitu długości).
+    """
+    cx, cy = dw//2, dh//2
+    font, font_scale, thickness = ID_EDIT_FONT
+    (tw, th), baseline = cv2.getTextSize(input_buffer + '|', font, font_scale, thickness)
+    return (min(cx - 120, cx - 50), min(cy - 40, cy + 25 - th),
+            max(cx + 120, cx - 50 + tw), max(cy + 40, cy + 25 + baseline))
+
+def frame_dirty_rects(dw, dh):
+    """
+    Zwraca prostokąty (x0, y0, x1, y1) obrazu wyświetlanego, które mogły zostać zamalowane
+    w bieżącej klatce: paski interfejsu, panel pomocy, konsola, okno edycji ID oraz
+    obrysy geometrii (miejsca, trasa, podgląd, punkty tymczasowe) z zapasem na etykiety.
+    """
+    def clamp(x0, y0, x1, y1, pad=0):
+        return (max(0, int(x0) - pad), max(0, int(y0) - pad), min(dw, int(x1) + pad + 1), min(dh, int(y1) + pad + 1))
+
+    rects = [clamp(0, 0, dw, 62), clamp(0, dh - 41, dw, dh)]
+    if show_help_panel: rects.append(clamp(10, 45, 230, 395))
+    if console_ui.current_rect:
+        cx, cy, cw, ch = console_ui.current_rect
+        rects.append(clamp(cx, cy, cx + cw, cy + ch))
+    if is_editing_id: rects.append(clamp(*id_edit_rect(dw, dh), 4))
+
+    bbox = spots_bbox()
+    if bbox:
+        rects.append(clamp(*(v * scale_factor for v in bbox), pad=max(DIRTY_PAD, spot_grid['label_w'] + 4)))
+    if route_points:
+        srp = scaled_route()
+        (x0, y0), (x1, y1) = srp.min(axis=0), srp.max(axis=0)
+        rects.append(clamp(x0, y0, x1, y1, DIRTY_PAD))
+    if mode == 'p' and preview_cache['pts'] is not None:
+        (x0, y0), (x1, y1) = preview_cache['pts'].min(axis=0), preview_cache['pts'].max(axis=0)
+        rects.append(clamp(x0, y0, x1, y1, 4))
+    if temp_points:
+        tp = temp_points.array * scale_factor
+        (x0, y0), (x1, y1) = tp.min(axis=0), tp.max(axis=0)
+        rects.append(clamp(min(x0, mouse_curr_x), min(y0, mouse_curr_y), max(x1, mouse_curr_x), max(y1, mouse_curr_y), 10))
+    return rects
+
 def create_rotated_rect(center, w, h, angle):
-    cx, cy = center; theta = np.radians(angle); cos_a, sin_a = np.cos(theta), np.sin(theta)
-    hw, hh = w/2, h/2
-    corners = [(-hw,-hh), (hw,-hh), (hw,hh), (-hw,hh)]
-    return [(int(cx + px*cos_a - py*sin_a), int(cy + px*sin_a + py*cos_a)) for px, py in corners]
+    return [tuple(int(c) for c in p) for p in create_rotated_rect_np(center, w, h, angle)]
 
-def save_data(filepath):
-    os.makedirs(os.path.dirname(filepath), exist_ok=True) 
+def create_rotated_rect_np(center, w, h, angle):
+    return rotated_rect_corners(float(center[0]), float(center[1]), float(w), float(h), float(angle))
 
-    data = {'car_park_positions': car_park_positions, 'route_points': route_points}
-    with open(filepath, 'wb') as f: 
-        pickle.dump(data, f)
+def save_data(filepath):
+    save_positions(filepath, car_park_positions, route_points.tolist())
     print(f"[SUCCESS] Saved {len(car_park_positions)} spots.")
 
+def switch_mode(new_mode):
+    global mode, show_help_panel
+    mode = new_mode; show_help_panel = False
+    if new_mode == 'i': temp_points.clear()
+    print(f"[MODE] Przełaczono na: {MODE_LABELS[new_mode]}")
+
+def reset_all():
+    global car_park_positions
+    car_park_positions = []; route_points.clear()
+    invalidate_spot_grid()
+    print("[RESET] Usunieto wszystkie punkty")
+
+def toggle_ui_hidden():
+    global ui_force_hidden
+    ui_force_hidden = not ui_force_hidden
+
+def toggle_console():
+    global last_h_press_time
+    if time.monotonic() - last_h_press_time > 0.3:
+        console_ui.toggle()
+        last_h_press_time = time.monotonic()
+
+@functools.lru_cache(maxsize=64)
+def status_texts(mode, n_temp, n_route, has_spots):
+    """
+    Buduje teksty paska instrukcji i paska statusu dla danego stanu edytora.
+    Wynik jest zapamiętywany - w stanie ustalonym pętla nie formatuje napisów co klatkę.
+    Zwraca (instrukcja, podinstrukcja, status, podpowiedź, szerokość podpowiedzi w px).
+    """
+    instruction = ""; sub_instruction = ""
+    if mode == 'c': instruction = "Zaznacz przekątną miejsca (2 punkty) i wciśnij ENTER"
+    elif mode == 'p': instruction = "TRYB PROSTOKĄT: Kliknij LPM aby dodać miejsce"; sub_instruction = "ROLKA MYSZY: OBRÓT | PPM: USUŃ MIEJSCE"
+    elif mode == 'i': instruction = "TRYB WIELOKĄT: Klikaj narożniki miejsca"; sub_instruction = f"ZAZNACZONO: {n_temp}/4 PKT | PPM: COFNIJ"
+    elif mode == 'e': instruction = "TRYB EDYCJI: Kliknij na miejsce, aby zmienić ID"
+    elif mode == 't': instruction = "TRYB TRASY: Wyznacz ścieżkę dojazdu"; sub_instruction = f"PUNKTY TRASY: {n_route} | PPM: COFNIJ"
+
+    modes_map = {'p': 'PROSTOKĄT', 'i': 'WIELOKĄT', 't': 'TRASA', 'e': 'EDYCJA ID'}
+    status_txt = f"TRYB: {modes_map.get(mode, '?')} (Zmień: P, I, T, E)"
+
+    if not has_spots: hint_text = "KROK 1: Dodaj miejsca parkingowe (Wciśnij P lub I)"
+    elif not n_route: hint_text = "KROK 2: Wyznacz trasę przejazdu (Wciśnij T)"
+    else: hint_text = "GOTOWE. Wciśnij 'ENTER' aby zapisać i wyjść"
+    (tw_hint, _), _ = cv2.getTextSize(hint_text, cv2.FONT_HERSHEY_SIMPLEX, 0.5, 1)
+    return instruction, sub_instruction, status_txt, hint_text, tw_hint
+
+# --- OBSŁUGA KLAWISZY ---
+# Kody liczone raz; pętla główna robi jedno wyszukanie w słowniku zamiast łańcucha elif
+KEY_NONE = 255; KEY_ENTER = 13; KEY_BACKSPACE = 8; KEY_QUIT = ord('q')
+# Tablica kod klawisza -> akceptowany znak ID (cyfry i litery, litery wielkie), 0 = odrzucony
+ID_KEY_TABLE = bytes(ord(chr(c).upper()) if chr(c).isascii() and chr(c).isalnum() else 0 for c in range(128))
+MODE_LABELS = {'p': 'Prostokat', 'i': 'WIELOKAT', 't': 'TRASA', 'e': 'EDYCJA ID'}
+KEY_HANDLERS = {
+    ord('u'): toggle_ui_hidden,
+    ord('h'): toggle_console,
+    ord('s'): lambda: save_data(positions_file),
+    ord('p'): lambda: switch_mode('p'),
+    ord('i'): lambda: switch_mode('i'),
+    ord('t'): lambda: switch_mode('t'),
+    ord('e'): lambda: switch_mode('e'),
+    ord('r'): reset_all,
+}
+
 def mouse_events(event, x, y, flags, params):
-    global temp_points, is_editing_id, edit_target_index, input_buffer, mouse_curr_x, mouse_curr_y, current_angle
-    global car_park_positions, route_points, should_exit, last_action_time, ui_force_hidden, show_help_panel, mode, rect_w, rect_h
+    with state_lock:
+        handle_mouse(event, x, y, flags, params)
+
+def handle_mouse(event, x, y, flags, params):
+    global is_editing_id, edit_target_index, input_buffer, mouse_curr_x, mouse_curr_y, current_angle
+    global car_park_positions, should_exit, last_action_time, ui_force_hidden, show_help_panel, mode, rect_w, rect_h
+    global needs_redraw
+    needs_redraw = True
     
     if console_ui and console_ui.visible: 
         if console_ui.handle_mouse(event, x, y, flags): return 
@@ -95,7 +403,7 @@ def mouse_events(event, x, y, flags, params):
     real_x, real_y = int(x / scale_factor), int(y / scale_factor)
 
     if event == cv2.EVENT_MOUSEWHEEL and mode == 'p':
-        last_action_time = time.time()
+        last_action_time = time.monotonic()
         step = 5
         if flags > 0: current_angle += step
         else: current_angle -= step
@@ -104,7 +412,7 @@ def mouse_events(event, x, y, flags, params):
         if not ui_force_hidden:
             if 10 <= x <= 80 and 10 <= y <= 35:
                 show_help_panel = not show_help_panel 
-                last_action_time = time.time() 
+                last_action_time = time.monotonic() 
                 return
 
             if show_help_panel:
@@ -115,7 +423,7 @@ def mouse_events(event, x, y, flags, params):
                 btn_w, btn_h = 220, 35
                 btn_x, btn_y = disp_w - btn_w - 10, 10
                 
-                is_auto_hidden = (mode in ['t', 'p', 'i'] and (time.time() - last_action_time < 3.0))
+                is_auto_hidden = (mode in ['t', 'p', 'i'] and (time.monotonic() - last_action_time < 3.0))
                 
                 if not is_auto_hidden or show_help_panel:
                     if btn_x <= x <= btn_x+btn_w and btn_y <= y <= btn_y+btn_h: should_exit = True; return
@@ -128,71 +436,255 @@ def mouse_events(event, x, y, flags, params):
             new_id = get_next_id()
             pts = create_rotated_rect((real_x, real_y), rect_w, rect_h, current_angle)
             car_park_positions.append({'id': new_id, 'points': pts, 'irregular': False})
-            last_action_time = time.time()
+            invalidate_spot_grid()
+            last_action_time = time.monotonic()
             print(f"[+] Added Spot (ID: {new_id})")
             
         elif mode == 'i':
             temp_points.append((real_x, real_y))
-            last_action_time = time.time()
+            last_action_time = time.monotonic()
             print(f"[INFO] Punkt {len(temp_points)}/4")
             if len(temp_points) == 4:
                 new_id = get_next_id()
-                car_park_positions.append({'id': new_id, 'points': temp_points.copy(), 'irregular': True})
-                temp_points = []
+                car_park_positions.append({'id': new_id, 'points': temp_points.tolist(), 'irregular': True})
+                invalidate_spot_grid()
+                temp_points.clear()
                 print(f"[+] Created irregular spot (ID: {new_id})")
                 
         elif mode == 't':
             route_points.append((real_x, real_y))
-            last_action_time = time.time()
+            last_action_time = time.monotonic()
             print(f"[+] Added route point ({len(route_points)})")
             
         elif mode == 'e':
-            found = False
-            for i, pos in enumerate(car_park_positions):
-                if cv2.pointPolygonTest(np.array(pos['points'], np.int32), (real_x, real_y), False) >= 0:
-                    edit_target_index = i
-                    input_buffer = str(pos['id'])
-                    is_editing_id = True
-                    print(f"[EDIT] Edycja ID: {input_buffer}")
-                    found = True
-                    break
-            if not found: print("[-] Brak miejsca w tym punkcie.")
+            i = spot_at(real_x, real_y)
+            if i != -1:
+                edit_target_index = i
+                input_buffer = str(car_park_positions[i]['id'])
+                is_editing_id = True
+                print(f"[EDIT] Edycja ID: {input_buffer}")
+            else: print("[-] Brak miejsca w tym punkcie.")
                     
         elif mode == 'c':
-            if len(temp_points) >= 2: temp_points = []
+            if len(temp_points) >= 2: temp_points.clear()
             temp_points.append((real_x, real_y))
             print(f"[CALIB] Punkt {len(temp_points)}/2")
 
     elif event == cv2.EVENT_RBUTTONDOWN:
-        last_action_time = time.time()
+        last_action_time = time.monotonic()
         if mode == 't' and route_points: 
             route_points.pop(); print("[-] Undo trace point")
         elif mode in ['p','i']:
             deleted = False
-            for i, p in enumerate(car_park_positions):
-                if cv2.pointPolygonTest(np.array(p['points'],np.int32), (real_x,real_y), False) >= 0:
-                    removed_id = p['id']
-                    car_park_positions.pop(i)
-                    print(f"[-] Removed Spot ID: {removed_id}")
-                    deleted = True
-                    break
+            i = spot_at(real_x, real_y)
+            if i != -1:
+                removed_id = car_park_positions.pop(i)['id']
+                invalidate_spot_grid()
+                print(f"[-] Removed Spot ID: {removed_id}")
+                deleted = True
             if not deleted and mode == 'i' and temp_points:
                 temp_points.pop(); print("[-] Undo polygon point")
         elif temp_points: 
-            temp_points = []; print("[-] Cleared polygon points")
+            temp_points.clear(); print("[-] Cleared polygon points")
+
+def render_frame(frame_buf, img_stat, dirty_rects, dw, dh):
+    """
+    Rysuje pełną klatkę edytora do `frame_buf` na podstawie bieżącego stanu.
+    Przed rysowaniem przywraca czyste tło w `dirty_rects` (None = całe tło).
+    Zwraca (klatka, prostokąty zamalowane w tej klatce). Wywoływać z blokadą state_lock.
+    """
+    auto_hidden = (mode in ['t', 'p', 'i'] and (time.monotonic() - last_action_time < 3.0))
+    status_bars_visible = not ui_force_hidden
+    buttons_visible = not ui_force_hidden and (not auto_hidden or show_help_panel or is_editing_id)
+    info_btn_visible = not ui_force_hidden 
+
+    if dirty_rects is None: np.copyto(frame_buf, img_stat)
+    else:
+        for x0, y0, x1, y1 in dirty_rects: frame_buf[y0:y1, x0:x1] = img_stat[y0:y1, x0:x1]
+    frame = frame_buf
+
+    def sc(p): return (int(p[0]*scale_factor), int(p[1]*scale_factor))
+
+    # RYSOWANIE
+    if mode=='c':
+        for p in temp_points: cv2.circle(frame, sc(p), 5, (0,0,255), -1)
+        if len(temp_points)==2:
+            cv2.rectangle(frame, sc(temp_points[0]), sc(temp_points[1]), (255,0,0), 2)
+            frame = draw_text_pl(frame, "Zapisz (ENTER)", (sc(temp_points[0])[0], sc(temp_points[0])[1]-10), 0.7, (0,255,0))
+    else:
+        if route_points:
+            srp = scaled_route()
+            cv2.polylines(frame, [srp], False, (255,255,0), 2)
+            for p in map(tuple, srp.tolist()): cv2.circle(frame, p, 5, (255,255,0), -1)
+
+        # Jedno wywołanie polylines na kolor (pętla po wielokątach odbywa się w C++)
+        edit_polys, irregular_polys, normal_polys = [], [], []
+        for i, p in enumerate(car_park_positions):
+            if is_editing_id and i == edit_target_index: edit_polys.append(spot_points_disp(p))
+            elif p.get('irregular'): irregular_polys.append(spot_points_disp(p))
+            else: normal_polys.append(spot_points_disp(p))
+        if normal_polys: cv2.polylines(frame, normal_polys, True, (0,255,0), 2)
+        if irregular_polys: cv2.polylines(frame, irregular_polys, True, (255,0,255), 2)
+        if edit_polys: cv2.polylines(frame, edit_polys, True, (0,255,255), 2)
+
+        for p in car_park_positions:
+            cv2.putText(frame, str(p['id']), spot_label_disp(p), LABEL_FONT[0], LABEL_FONT[1], (255,255,255), LABEL_FONT[2])
+
+        if mode == 'p' and not is_editing_id:
+            real_mx, real_my = int(mouse_curr_x/scale_factor), int(mouse_curr_y/scale_factor)
+            key = (real_mx, real_my, current_angle, rect_w, rect_h, scale_factor)
+            if key != preview_cache['key']:
+                preview_cache['key'] = key
+                preview_cache['pts'] = (create_rotated_rect_np((real_mx, real_my), rect_w, rect_h, current_angle) * scale_factor).astype(np.int32)
+            cv2.polylines(frame, [preview_cache['pts']], True, (0, 255, 255), 1)
+
+        elif mode == 'i' and temp_points:
+            if len(temp_points) > 1: cv2.polylines(frame, [(temp_points.array * scale_factor).astype(np.int32)], False, (0,255,255), 2)
+            for tp in temp_points: cv2.circle(frame, sc(tp), 5, (0, 0, 255), -1)
+            if len(temp_points) > 0:
+                last_pt = sc(temp_points[-1]); curr_pt = (mouse_curr_x, mouse_curr_y)
+                cv2.line(frame, last_pt, curr_pt, (100, 255, 255), 1)
 
-def main():
+        if is_editing_id:
+            cx, cy = dw//2, dh//2
+            cv2.rectangle(frame, (cx-120, cy-40), (cx+120, cy+40), (0,0,0), -1)
+            cv2.rectangle(frame, (cx-120, cy-40), (cx+120, cy+40), (0,255,255), 2)
+            cv2.putText(frame, "EDYCJA ID:", (cx-110, cy-15), 0, 0.6, (200,200,200), 1)
+            cv2.putText(frame, f"{input_buffer}{'|' if blink_state else ''}", (cx-50, cy+25), ID_EDIT_FONT[0], ID_EDIT_FONT[1], (255,255,255), ID_EDIT_FONT[2])
+
+    # === INTERFEJS ===
+    if info_btn_visible:
+        btn_ui_color = (0, 100, 0) if show_help_panel else ((30, 30, 30) if auto_hidden else (50, 50, 50))
+        cv2.rectangle(frame, (10, 10), (80, 35), btn_ui_color, -1)
+        cv2.rectangle(frame, (10, 10), (80, 35), (200, 200, 200), 1)
+        frame = draw_text_pl(frame, "POMOC", (18, 18), 0.45, (255,255,255))
+
+    if not ui_force_hidden and show_help_panel and mode != 'c':
+        plain, sprite, mask = help_panel_sprite()
+        roi = frame[HELP_PANEL_Y:HELP_PANEL_Y + plain.shape[0], HELP_PANEL_X:HELP_PANEL_X + plain.shape[1]]
+        h, w = roi.shape[:2]
+        cv2.addWeighted(plain[:h, :w], 0.85, roi, 0.15, 0, dst=roi)
+        np.copyto(roi, sprite[:h, :w], where=mask[:h, :w])
+
+    if buttons_visible and mode != 'c':
+        btn_w, btn_h = 220, 35; btn_x, btn_y = dw - btn_w - 10, 10
+        col = (100,100,100) if is_editing_id else (0,200,0)
+        cv2.rectangle(frame, (btn_x, btn_y), (btn_x+btn_w, btn_y+btn_h), col, -1)
+        cv2.rectangle(frame, (btn_x, btn_y), (btn_x+btn_w, btn_y+btn_h), (255,255,255), 1)
+        frame = draw_text_pl(frame, "ZATWIERDŹ [ENTER]", (btn_x+20, btn_y+8), 0.55, (255,255,255)) 
+
+    if status_bars_visible:
+        instruction, sub_instruction, status_txt, hint_text, tw_hint = status_texts(
+            mode, len(temp_points), len(route_points), bool(car_park_positions))
+
+        if instruction and not is_editing_id:
+            bg_w = 550; bg_x = (dw - bg_w) // 2
+            blend_rects(frame, [((bg_x, 10), (bg_x + bg_w, 55 if sub_instruction else 35), (0,0,0), -1)], 0.7)
+            frame = draw_text_pl(frame, instruction, (bg_x + 20, 15), 0.5, (0,255,255))
+            if sub_instruction: frame = draw_text_pl(frame, sub_instruction, (bg_x + 20, 35), 0.45, (200,200,200))
+
+    if mode != 'c' and status_bars_visible:
+        cv2.rectangle(frame, (0, dh-40), (dw, dh), (0,0,0), -1)
+        frame = draw_text_pl(frame, status_txt, (10, dh-30), 0.5, (0,255,255))
+
+        text_x = dw - tw_hint - 20
+        frame = draw_text_pl(frame, hint_text, (text_x, dh-30), 0.5, (180, 255, 180))
+
+    # RYSOWANIE KONSOLI
+    if mode != 'c' and not ui_force_hidden:
+        frame = console_ui.draw(frame)
+
+    return frame, (None if mode == 'c' else frame_dirty_rects(dw, dh))
+
+def handle_key(k):
+    """Obsługa klawisza w pętli głównej edytora. Wywoływać z blokadą state_lock."""
+    global is_editing_id, input_buffer, should_exit
+    if is_editing_id:
+        if k==KEY_ENTER and input_buffer:
+            for p in car_park_positions: 
+                if str(p['id'])==input_buffer: p['id'] = car_park_positions[edit_target_index]['id']
+            car_park_positions[edit_target_index]['id'] = input_buffer
+            spot_grid['bbox'] = None  # Nowa etykieta może być dłuższa - przelicz zapas tła
+            print(f"[EDIT] Zmieniono ID na: {input_buffer}")
+            is_editing_id=False
+        elif k==KEY_BACKSPACE: input_buffer = input_buffer[:-1]
+        else:
+            ch = ID_KEY_TABLE[k] if k < 128 else 0
+            if ch: input_buffer += chr(ch)
+    else:
+        if k==KEY_QUIT: should_exit=True
+        elif k==KEY_ENTER:
+            if mode == 'c' and len(temp_points)==2:
+                w = abs(temp_points[0][0]-temp_points[1][0])
+                h = abs(temp_points[0][1]-temp_points[1][1])
+                try:
+                    with open(TEMP_CALIB_FILE, "w") as f: json.dump({"rect_width": w, "rect_height": h}, f)
+                except: pass
+                should_exit = True
+            elif mode != 'c': should_exit = True
+        else:
+            handler = KEY_HANDLERS.get(k)
+            if handler: handler()
+
+def render_worker(img_stat, dw, dh):
+    """
+    Wątek renderujący (podwójne buforowanie): rysuje do bufora tylnego, a gotową klatkę
+    publikuje w render_state['front']. Wątek główny tylko wyświetla ją i obsługuje zdarzenia.
+    """
+    buffers = [np.empty_like(img_stat), np.empty_like(img_stat)]
+    # Każdy bufor przywracany jest według własnej historii zamalowanych prostokątów
+    dirty = [None, None]
+    back = 0
+    while True:
+        render_request.wait()
+        render_request.clear()
+        if render_state['stop']: break
+        with state_lock:
+            frame, dirty[back] = render_frame(buffers[back], img_stat, dirty[back], dw, dh)
+        # Publikacja czeka na zakończenie ewentualnego imshow poprzedniej klatki, więc
+        # bufor, do którego będziemy rysować następnym razem, nie jest już wyświetlany
+        with front_lock:
+            render_state['front'] = frame
+            render_state['pending'] = False
+        back ^= 1
+
+def reset_state():
+    """
+    Przywraca stan początkowy edytora. main() może być wywołany wielokrotnie w jednym
+    procesie (Launcher), więc dane poprzedniej sesji nie mogą przeciec do kolejnej.
+    """
+    global car_park_positions, mode, console_ui, scale_factor, rect_w, rect_h, current_angle, input_buffer
+    global is_editing_id, edit_target_index, blink_state, mouse_curr_x, mouse_curr_y, should_exit
+    global last_action_time, ui_force_hidden, show_help_panel, positions_file, last_h_press_time, needs_redraw
+    car_park_positions = []; route_points.clear(); temp_points.clear()
+    mode = 'p'; console_ui = None; scale_factor = 1.0
+    rect_w, rect_h = 50, 100; current_angle = 0; input_buffer = ""; is_editing_id = False
+    edit_target_index = -1; blink_state = True; mouse_curr_x, mouse_curr_y = 0, 0
+    should_exit = False
+    last_action_time = 0
+    ui_force_hidden = False
+    show_help_panel = False
+    positions_file = ""
+    last_h_press_time = 0
+    needs_redraw = True
+    preview_cache.update(key=None, pts=None)
+    route_cache.update(key=None, pts=None)
+    invalidate_spot_grid()
+    render_state.update(front=None, pending=False, stop=False)
+    render_request.clear()
+
+def main(argv=None):
     if sys.platform.startswith('win'):
-        try:
-            import io
-            sys.stdout = io.TextIOWrapper(sys.stdout.buffer, encoding='utf-8')
+        # Bez podmiany sys.stdout - nowy TextIOWrapper zamknąłby wspólny bufor przy sprzątaniu
+        try: sys.stdout.reconfigure(encoding='utf-8')
         except: pass
-    global mode, car_park_positions, route_points, console_ui, scale_factor, rect_w, rect_h, positions_file
-    global is_editing_id, input_buffer, edit_target_index, blink_state, should_exit, last_action_time, ui_force_hidden, temp_points, show_help_panel, last_h_press_time
+    global mode, car_park_positions, console_ui, scale_factor, rect_w, rect_h, positions_file
+    global is_editing_id, input_buffer, edit_target_index, blink_state, should_exit, last_action_time, ui_force_hidden, show_help_panel, last_h_press_time, needs_redraw
+    reset_state()
     
     parser = argparse.ArgumentParser()
     parser.add_argument("--image"); parser.add_argument("--lot", required=True); parser.add_argument("--mode", default="p")
-    args = parser.parse_args()
+    args = parser.parse_args(argv)
 
     current_lot_name = args.lot
     
@@ -201,25 +693,21 @@ def main():
     else:
         positions_file = get_positions_file(current_lot_name)
     
-    rect_w, rect_h = load_config_dims(current_lot_name)
+    rect_w, rect_h, config_img_path = load_lot_settings(current_lot_name)
     
     if current_lot_name != "empty_calibration" and os.path.exists(positions_file):
         try:
-            with open(positions_file, 'rb') as f:
-                d = pickle.load(f)
-                if isinstance(d, dict): 
-                    car_park_positions[:] = d.get('car_park_positions', [])
-                    route_points[:] = d.get('route_points', [])
-                elif isinstance(d, list): 
-                    for i, it in enumerate(d):
-                        if isinstance(it, dict): car_park_positions.append(it)
-                        else: car_park_positions.append({'id':str(i+1), 'points':it[0], 'irregular':it[1]=='i'})
+            spots, route = load_positions(positions_file)
+            for i, it in enumerate(spots):
+                if isinstance(it, dict): car_park_positions.append(it)
+                else: car_park_positions.append({'id':str(i+1), 'points':it[0], 'irregular':it[1]=='i'})
+            route_points.clear(); route_points.extend(route)
         except: pass
 
     # POBIERANIE OBRAZU
     img_path = None
     if args.image: img_path = args.image
-    if not img_path and current_lot_name != "empty_calibration": img_path = get_image_path_from_config(current_lot_name)
+    if not img_path and current_lot_name != "empty_calibration": img_path = config_img_path
     if not img_path:
         sd = os.path.join(BASE_DIR, "data", "source", "img")
         if os.path.exists(sd):
@@ -266,161 +754,57 @@ def main():
     if mode == 'c': print("Zaznacz przekatna miejsca (2 punkty).")
     else: print("[INFO] Witaj w edytorze! Wcisnij przycisk INFO (lewy gorny rog) dla pomocy.")
 
-    frame_cnt = 0
+    # Rozgrzanie jądra (kompilacja Numba) przed pętlą, a nie przy pierwszym ruchu myszy
+    create_rotated_rect_np((0, 0), rect_w, rect_h, 0)
+    # Termin następnego mrugnięcia kursora (zegar monotoniczny - niezależny od tempa pętli)
+    next_blink_ts = time.monotonic() + BLINK_INTERVAL_S
+    drawn_key = None
+
+    render_thread = threading.Thread(target=render_worker, args=(img_stat, dw, dh), daemon=True)
+    render_thread.start()
 
     while True:
-        auto_hidden = (mode in ['t', 'p', 'i'] and (time.time() - last_action_time < 3.0))
-        status_bars_visible = not ui_force_hidden
-        buttons_visible = not ui_force_hidden and (not auto_hidden or show_help_panel or is_editing_id)
-        info_btn_visible = not ui_force_hidden 
-        
-        if should_exit:
-            if mode != 'c': save_data(positions_file)
-            break
-
-        frame = img_stat.copy()
-        frame_cnt += 1
-        if frame_cnt % 15 == 0: blink_state = not blink_state 
-
-        def sc(p): return (int(p[0]*scale_factor), int(p[1]*scale_factor))
-        def scp(pts): return np.array([sc(p) for p in pts], np.int32)
-
-        # RYSOWANIE
-        if mode=='c':
-            for p in temp_points: cv2.circle(frame, sc(p), 5, (0,0,255), -1)
-            if len(temp_points)==2:
-                cv2.rectangle(frame, sc(temp_points[0]), sc(temp_points[1]), (255,0,0), 2)
-                frame = draw_text_pl(frame, "Zapisz (ENTER)", (sc(temp_points[0])[0], sc(temp_points[0])[1]-10), 0.7, (0,255,0))
+        with state_lock:
+            if should_exit:
+                if mode != 'c': save_data(positions_file)
+                break
+
+            now = time.monotonic()
+            auto_hidden = (mode in ['t', 'p', 'i'] and (now - last_action_time < 3.0))
+            if now >= next_blink_ts:
+                blink_state = not blink_state; next_blink_ts = now + BLINK_INTERVAL_S
+
+            # Przerysowanie tylko po zdarzeniu (mysz/klawisz) lub zmianie stanu zależnej od czasu
+            state_key = (auto_hidden, blink_state if is_editing_id else None, console_ui.revision)
+            if needs_redraw or state_key != drawn_key:
+                needs_redraw = False; drawn_key = state_key
+                render_state['pending'] = True
+                render_request.set()
+
+        # Wątek główny tylko wyświetla gotową klatkę i obsługuje zdarzenia okna
+        with front_lock:
+            frame = render_state['front']
+            render_state['front'] = None
+            if frame is not None: cv2.imshow(win, frame)
+            pending = render_state['pending']
+
+        # Podczas edycji ID jedyną zmianą obrazu jest kursor - czekamy dokładnie do jego mrugnięcia
+        if pending:
+            wait_ms = 1
+        elif is_editing_id:
+            wait_ms = max(1, int((next_blink_ts - time.monotonic()) * 1000))
         else:
-            if route_points:
-                srp = [sc(p) for p in route_points]
-                for i in range(len(srp)-1): cv2.line(frame, srp[i], srp[i+1], (255,255,0), 2)
-                for p in srp: cv2.circle(frame, p, 5, (255,255,0), -1)
-
-            for i, p in enumerate(car_park_positions):
-                col = (0,255,255) if is_editing_id and i==edit_target_index else ((255,0,255) if p.get('irregular') else (0,255,0))
-                cv2.polylines(frame, [scp(p['points'])], True, col, 2)
-                M = cv2.moments(scp(p['points']))
-                if M['m00']: cv2.putText(frame, str(p['id']), (int(M['m10']/M['m00']), int(M['m01']/M['m00'])), 0, 0.5, (255,255,255), 2)
-
-            if mode == 'p' and not is_editing_id:
-                real_mx, real_my = int(mouse_curr_x/scale_factor), int(mouse_curr_y/scale_factor)
-                pts = create_rotated_rect((real_mx, real_my), rect_w, rect_h, current_angle)
-                cv2.polylines(frame, [scp(pts)], True, (0, 255, 255), 1)
-            
-            elif mode == 'i' and temp_points:
-                if len(temp_points) > 1: cv2.polylines(frame, [scp(temp_points)], False, (0,255,255), 2)
-                for tp in temp_points: cv2.circle(frame, sc(tp), 5, (0, 0, 255), -1)
-                if len(temp_points) > 0:
-                    last_pt = sc(temp_points[-1]); curr_pt = (mouse_curr_x, mouse_curr_y)
-                    cv2.line(frame, last_pt, curr_pt, (100, 255, 255), 1)
-
-            if is_editing_id:
-                cx, cy = dw//2, dh//2
-                cv2.rectangle(frame, (cx-120, cy-40), (cx+120, cy+40), (0,0,0), -1)
-                cv2.rectangle(frame, (cx-120, cy-40), (cx+120, cy+40), (0,255,255), 2)
-                cv2.putText(frame, "EDYCJA ID:", (cx-110, cy-15), 0, 0.6, (200,200,200), 1)
-                cv2.putText(frame, f"{input_buffer}{'|' if blink_state else ''}", (cx-50, cy+25), 0, 1.2, (255,255,255), 3)
-
-        # === INTERFEJS ===
-        if info_btn_visible:
-            btn_ui_color = (0, 100, 0) if show_help_panel else ((30, 30, 30) if auto_hidden else (50, 50, 50))
-            cv2.rectangle(frame, (10, 10), (80, 35), btn_ui_color, -1)
-            cv2.rectangle(frame, (10, 10), (80, 35), (200, 200, 200), 1)
-            frame = draw_text_pl(frame, "POMOC", (18, 18), 0.45, (255,255,255))
-
-        if not ui_force_hidden and show_help_panel and mode != 'c':
-            overlay = frame.copy()
-            panel_x, panel_y, panel_w, panel_h = 10, 45, 220, 350
-            cv2.rectangle(overlay, (panel_x, panel_y), (panel_x + panel_w, panel_y + panel_h), (20, 20, 20), -1)
-            cv2.rectangle(overlay, (panel_x, panel_y), (panel_x + panel_w, panel_y + panel_h), (100, 100, 100), 1)
-            frame = cv2.addWeighted(overlay, 0.85, frame, 0.15, 0)
-            frame = draw_text_pl(frame, "SKRÓTY KLAWISZOWE", (panel_x + 30, panel_y + 15), 0.5, (0, 255, 255))
-            cv2.line(frame, (panel_x+10, panel_y+35), (panel_x+panel_w-10, panel_y+35), (100,100,100), 1)
-            help_list = [("TRYBY:", ""), (" [P]", "Dodaj Prostokąt"), (" [I]", "Dodaj Wielokąt (4 pkt)"), (" [T]", "Rysuj Trasę"), (" [E]", "Edytuj ID miejsca"),
-                         ("AKCJE:", ""), (" [R]", "Resetuj wszystko"), (" [S]", "Zapisz zmiany"), (" [H]", "Pokaż/Ukryj print"), (" [Q]", "Wyjdź"), (" [U]", "Ukryj interfejs")]
-            curr_y = panel_y + 55
-            for k_txt, desc in help_list:
-                if desc == "": frame = draw_text_pl(frame, k_txt, (panel_x+10, curr_y), 0.45, (150,150,150)); curr_y += 25
-                else: frame = draw_text_pl(frame, k_txt, (panel_x+10, curr_y), 0.45, (0,255,0)); frame = draw_text_pl(frame, desc, (panel_x+50, curr_y), 0.45, (220,220,220)); curr_y += 25
-
-        if buttons_visible and mode != 'c':
-            btn_w, btn_h = 220, 35; btn_x, btn_y = dw - btn_w - 10, 10
-            col = (100,100,100) if is_editing_id else (0,200,0)
-            cv2.rectangle(frame, (btn_x, btn_y), (btn_x+btn_w, btn_y+btn_h), col, -1)
-            cv2.rectangle(frame, (btn_x, btn_y), (btn_x+btn_w, btn_y+btn_h), (255,255,255), 1)
-            frame = draw_text_pl(frame, "ZATWIERDŹ [ENTER]", (btn_x+20, btn_y+8), 0.55, (255,255,255)) 
-
-        if status_bars_visible:
-            instruction = ""; sub_instruction = ""
-            if mode == 'c': instruction = "Zaznacz przekątną miejsca (2 punkty) i wciśnij ENTER"
-            elif mode == 'p': instruction = "TRYB PROSTOKĄT: Kliknij LPM aby dodać miejsce"; sub_instruction = "ROLKA MYSZY: OBRÓT | PPM: USUŃ MIEJSCE"
-            elif mode == 'i': instruction = "TRYB WIELOKĄT: Klikaj narożniki miejsca"; sub_instruction = f"ZAZNACZONO: {len(temp_points)}/4 PKT | PPM: COFNIJ"
-            elif mode == 'e': instruction = "TRYB EDYCJI: Kliknij na miejsce, aby zmienić ID"
-            elif mode == 't': instruction = "TRYB TRASY: Wyznacz ścieżkę dojazdu"; sub_instruction = f"PUNKTY TRASY: {len(route_points)} | PPM: COFNIJ"
-            
-            if instruction and not is_editing_id:
-                bg_w = 550; bg_x = (dw - bg_w) // 2
-                overlay = frame.copy()
-                cv2.rectangle(overlay, (bg_x, 10), (bg_x + bg_w, 55 if sub_instruction else 35), (0,0,0), -1)
-                frame = cv2.addWeighted(overlay, 0.7, frame, 0.3, 0)
-                frame = draw_text_pl(frame, instruction, (bg_x + 20, 15), 0.5, (0,255,255))
-                if sub_instruction: frame = draw_text_pl(frame, sub_instruction, (bg_x + 20, 35), 0.45, (200,200,200))
-
-        if mode != 'c' and status_bars_visible:
-            cv2.rectangle(frame, (0, dh-40), (dw, dh), (0,0,0), -1)
-            modes_map = {'p': 'PROSTOKĄT', 'i': 'WIELOKĄT', 't': 'TRASA', 'e': 'EDYCJA ID'}
-            status_txt = f"TRYB: {modes_map.get(mode, '?')} (Zmień: P, I, T, E)"
-            frame = draw_text_pl(frame, status_txt, (10, dh-30), 0.5, (0,255,255))
-            
-            hint_text = ""
-            if not car_park_positions: hint_text = "KROK 1: Dodaj miejsca parkingowe (Wciśnij P lub I)"
-            elif not route_points: hint_text = "KROK 2: Wyznacz trasę przejazdu (Wciśnij T)"
-            else: hint_text = "GOTOWE. Wciśnij 'ENTER' aby zapisać i wyjść"
-            (tw_hint, th_hint), _ = cv2.getTextSize(hint_text, cv2.FONT_HERSHEY_SIMPLEX, 0.5, 1)
-            text_x = dw - tw_hint - 20
-            frame = draw_text_pl(frame, hint_text, (text_x, dh-30), 0.5, (180, 255, 180))
-
-        # RYSOWANIE KONSOLI
-        if mode != 'c' and not ui_force_hidden:
-            frame = console_ui.draw(frame)
+            wait_ms = UI_IDLE_WAIT_MS
+        k = cv2.waitKey(wait_ms) & 0xFF
+        if k == KEY_NONE: continue
 
-        cv2.imshow(win, frame)
-        k = cv2.waitKey(10) & 0xFF
+        with state_lock:
+            needs_redraw = True
+            handle_key(k)
 
-        if is_editing_id:
-            if k==13 and input_buffer:
-                for p in car_park_positions: 
-                    if str(p['id'])==input_buffer: p['id'] = car_park_positions[edit_target_index]['id']
-                car_park_positions[edit_target_index]['id'] = input_buffer
-                print(f"[EDIT] Zmieniono ID na: {input_buffer}")
-                is_editing_id=False
-            elif k==8: input_buffer = input_buffer[:-1]
-            elif 48<=k<=122: input_buffer += chr(k).upper()
-        else:
-            if k==ord('q'): should_exit=True
-            elif k==13:
-                if mode == 'c' and len(temp_points)==2:
-                    w = abs(temp_points[0][0]-temp_points[1][0])
-                    h = abs(temp_points[0][1]-temp_points[1][1])
-                    try:
-                        with open(TEMP_CALIB_FILE, "w") as f: json.dump({"rect_width": w, "rect_height": h}, f)
-                    except: pass
-                    should_exit = True
-                elif mode != 'c': should_exit = True
-
-            elif k==ord('u'): ui_force_hidden = not ui_force_hidden
-            elif k==ord('h'):
-                if time.time() - last_h_press_time > 0.3:
-                     console_ui.toggle()
-                     last_h_press_time = time.time()
-            
-            elif k==ord('s'): save_data(positions_file)
-            elif k==ord('p'): mode='p'; show_help_panel = False; print("[MODE] Przełaczono na: Prostokat")
-            elif k==ord('i'): mode='i'; show_help_panel = False; temp_points=[]; print("[MODE] Przełaczono na: WIELOKAT")
-            elif k==ord('t'): mode='t'; show_help_panel = False; print("[MODE] Przełaczono na: TRASA")
-            elif k==ord('e'): mode='e'; show_help_panel = False; print("[MODE] Przełaczono na: EDYCJA ID")
-            elif k==ord('r'): car_park_positions=[]; route_points=[]; print("[RESET] Usunieto wszystkie punkty")
+    render_state['stop'] = True
+    render_request.set()
+    render_thread.join(timeout=1.0)
 
     try: sys.stdout = sys.__stdout__
     except: pass
@@ -9,33 +9,62 @@ Zarządza interfejsem użytkownika (GUI) opartym na bibliotece tkinter, umożliw
 """
 
 import os
+import re
 import sys
+import copy
 import json
-import cv2
-import datetime
+import functools
+import importlib
 import subprocess
+import threading
+import queue
 import tkinter as tk
 from tkinter import filedialog, simpledialog, messagebox, ttk
 from pathlib import Path
 
 # --- KONFIGURACJA ŚCIEŻEK ---
 BASE_DIR = Path(__file__).resolve().parent
+BASE_DIR_STR = str(BASE_DIR)
 SRC_DIR = BASE_DIR / "src"
 CONFIG_DIR = BASE_DIR / "config"
 DATA_DIR = BASE_DIR / "data"
 IMG_DIR = DATA_DIR / "source" / "img"
 VIDEO_DIR = DATA_DIR / "source" / "video" 
+IMG_DIR_STR, VIDEO_DIR_STR = str(IMG_DIR), str(VIDEO_DIR)
 CONFIG_FILE = CONFIG_DIR / "parking_config.json"
 TEMP_URL_FILE = CONFIG_DIR / "temp_url_source.json"
 
+# Rozszerzenia plików pokazywanych na liście obrazów źródłowych
+IMAGE_EXTS = frozenset({'.png', '.jpg', '.jpeg'})
+
+# Znaki niedozwolone w nazwie pliku obrazu (dozwolone: litery, cyfry, spacja, '_' i '-')
+UNSAFE_NAME_CHARS = re.compile(r'[^\w \-]')
+
+# Maksymalny dłuższy bok obrazu referencyjnego (px) - większe klatki są pomniejszane
+MAX_REFERENCE_EDGE = 1920
+
+# Liczba klatek pomijanych na starcie strumienia (pierwsze bywają czarne lub niepełne)
+STREAM_WARMUP_FRAMES = 15
+
+# Skrypty podprogramów uruchamianych przez Launcher (run_stage)
+STAGE_SCRIPTS = ("app.py", "car_park_coordinate_generator.py", "add_parking_config.py")
+
 sys.path.append(str(SRC_DIR))
 
-try:
-    from src.utils import get_direct_youtube_url
-except ImportError:
-    def get_direct_youtube_url(url): 
-        """Fallback w przypadku braku modułu utils."""
-        return url 
+def get_direct_youtube_url(url):
+    """
+    Zamienia adres YouTube na bezpośredni adres strumienia (src.utils).
+
+    src.utils ładuje OpenCV i Pillow, więc jest importowany dopiero przy pierwszym
+    pobieraniu klatki, a nie przy starcie okna Launchera.
+    """
+    try:
+        from src.utils import get_direct_youtube_url as resolve
+    except ImportError:
+        return url  # Fallback w przypadku braku modułu utils
+    return resolve(url)
+
+from src.json_io import read_json, read_json_cached, write_json_atomic
 
 # --- NAPRAWA SKALOWANIA DPI (WINDOWS) ---
 try:
@@ -59,12 +88,39 @@ COLOR_LIST_BG = "#ffffff"
 FONT_MAIN = ("Segoe UI", 10)
 FONT_HEADER = ("Segoe UI", 16, "bold")
 FONT_SUBHEADER = ("Segoe UI", 10)
+FONT_BOLD = ("Segoe UI", 10, "bold")
+FONT_SECTION = ("Segoe UI", 11, "bold")
+FONT_DIALOG_HEADER = ("Segoe UI", 12, "bold")
+FONT_HINT = ("Segoe UI", 9)
+FONT_LIST = ("Consolas", 11)
+
+def init_styles(root):
+    """
+    Konfiguruje style ttk Launchera dla interpretera Tcl okna `root`.
+
+    Style ttk należą do interpretera, więc są ustawiane raz na każde okno główne tk.Tk
+    (kolejne wywołania dla tego samego okna nic nie robią).
+
+    Args:
+        root (tk.Tk): Okno główne, którego interpreter ma zostać skonfigurowany.
+    """
+    if getattr(root, "_launcher_styles", False): return
+    style = ttk.Style(root)
+    style.theme_use('clam')
+    style.configure("TButton", font=FONT_MAIN, padding=6, relief="flat")
+    style.configure("Run.TButton", background=COLOR_SUCCESS, foreground="white", font=FONT_BOLD)
+    style.map("Run.TButton", background=[("active", "#219150")])
+    style.configure("Create.TButton", background=COLOR_ACCENT, foreground="white", font=FONT_BOLD)
+    style.map("Create.TButton", background=[("active", "#2980b9")])
+    root._launcher_styles = True
 
+@functools.lru_cache(maxsize=1024)
 def make_relative(path_str):
     """
     Konwertuje ścieżkę absolutną na relatywną względem katalogu głównego projektu.
 
     Służy do zachowania przenośności plików konfiguracyjnych JSON między różnymi systemami.
+    Wyniki są zapamiętywane (realpath() sprawdza każdy katalog nadrzędny na dysku).
 
     Args:
         path_str (str): Pełna ścieżka do pliku lub katalogu.
@@ -78,10 +134,43 @@ def make_relative(path_str):
         return str(path_str)
     
     try:
-        path_obj = Path(path_str).resolve()
-        return str(path_obj.relative_to(BASE_DIR))
-    except (ValueError, Exception):
+        rel = os.path.relpath(os.path.realpath(path_str), BASE_DIR_STR)
+    except (ValueError, Exception):  # np. inny dysk na Windows
         return path_str
+    # Ścieżka spoza katalogu projektu zostaje bez zmian
+    return path_str if rel == os.pardir or rel.startswith(os.pardir + os.sep) else rel
+
+# Sparsowany parking_config.json, ważny dopóki nie zmieni się czas modyfikacji pliku
+_config_cache = {"mtime": None, "data": None}
+
+def _read_config():
+    """
+    Zwraca zawartość parking_config.json, parsując plik tylko po jego zmianie.
+
+    Zwracany słownik jest współdzielony - kod, który go modyfikuje, pracuje na kopii.
+
+    Returns:
+        dict: Konfiguracja lub pusty słownik, jeśli plik nie istnieje.
+    """
+    try:
+        mtime = CONFIG_FILE.stat().st_mtime_ns
+    except OSError:
+        return {}
+    if _config_cache["mtime"] != mtime:
+        _config_cache["data"] = read_json(CONFIG_FILE)
+        _config_cache["mtime"] = mtime
+    return _config_cache["data"]
+
+def _invalidate_config():
+    """Unieważnia pamięć podręczną konfiguracji (po zapisie pliku)."""
+    _config_cache["mtime"] = None
+
+def _write_config(data):
+    """Zapisuje parking_config.json atomowo (plik tymczasowy + os.replace)."""
+    try:
+        write_json_atomic(CONFIG_FILE, data)
+    finally:
+        _invalidate_config()
 
 def load_config_list():
     """
@@ -90,15 +179,11 @@ def load_config_list():
     Returns:
         list: Lista unikalnych nazw parkingów, z wyłączeniem wpisów technicznych.
     """
-    if CONFIG_FILE.exists():
-        try:
-            with open(CONFIG_FILE, 'r', encoding='utf-8') as f:
-                data = json.load(f)
-                lots = data.get("parking_lots", {})
-                return [name for name in lots.keys() if name not in ['default', 'empty_calibration']]
-        except json.JSONDecodeError:
-            return []
-    return []
+    try:
+        lots = _read_config().get("parking_lots", {})
+        return [name for name in lots.keys() if name not in ['default', 'empty_calibration']]
+    except json.JSONDecodeError:
+        return []
 
 def get_last_added_lot_name():
     """
@@ -109,15 +194,34 @@ def get_last_added_lot_name():
     Returns:
         str|None: Nazwa parkingu lub None, jeśli zapis nie został odnaleziony.
     """
-    temp_file = CONFIG_DIR / "temp_last_lot.json"
-    if temp_file.exists():
-        try:
-            with open(temp_file, 'r', encoding='utf-8') as f:
-                data = json.load(f)
-                return data.get('lot_name')
-        except Exception:
-            return None
-    return None
+    try:
+        return read_json_cached(CONFIG_DIR / "temp_last_lot.json").get('lot_name')
+    except Exception:  # Brak pliku (FileNotFoundError) lub uszkodzona zawartość
+        return None
+
+# Ukryte okno główne dla komunikatów spoza GUI - tworzone raz i używane ponownie
+_hidden_root_ref = None
+
+def _hidden_root():
+    """
+    Zwraca ukryte okno Tk (zawsze na wierzchu) pełniące rolę rodzica okien dialogowych.
+
+    Inicjalizacja interpretera Tcl jest kosztowna, więc okno żyje do końca programu.
+    Okna i zmienne Tk tworzone w innych miejscach podają jawnie swojego rodzica.
+
+    Returns:
+        tk.Tk: Ukryte okno główne.
+    """
+    global _hidden_root_ref
+    try:
+        alive = _hidden_root_ref is not None and _hidden_root_ref.winfo_exists()
+    except tk.TclError:
+        alive = False
+    if not alive:
+        _hidden_root_ref = tk.Tk()
+        _hidden_root_ref.withdraw()
+        _hidden_root_ref.attributes("-topmost", True)
+    return _hidden_root_ref
 
 def show_topmost_message(title, message, is_error=False):
     """
@@ -128,69 +232,160 @@ def show_topmost_message(title, message, is_error=False):
         message (str): Treść wyświetlanej wiadomości.
         is_error (bool): Jeśli True, używa ikony błędu zamiast informacji.
     """
-    root = tk.Tk()
-    root.withdraw()
-    root.attributes("-topmost", True)
     if is_error:
-        messagebox.showerror(title, message, parent=root)
+        messagebox.showerror(title, message, parent=_hidden_root())
     else:
-        messagebox.showinfo(title, message, parent=root)
-    root.destroy()
+        messagebox.showinfo(title, message, parent=_hidden_root())
 
-def capture_frame_from_source(video_source, lot_name_prefix):
+def open_video_capture(source):
     """
-    Pobiera pojedynczą klatkę ze źródła wideo i zapisuje ją jako obraz referencyjny PNG.
+    Otwiera źródło wideo backendem dobranym do typu źródła, z dekodowaniem sprzętowym, jeśli dostępne.
 
-    Obsługuje pliki lokalne oraz strumienie sieciowe (YouTube, RTSP, HTTP) przy użyciu OpenCV.
+    Strumienie sieciowe otwiera wyłącznie FFmpeg - próby innych backendów (GStreamer, MSMF)
+    kończą się dla nich długim sondowaniem i porażką. Pliki lokalne na Windows otwiera MSMF
+    (dekodowanie sprzętowe), a w razie niepowodzenia dowolny dostępny backend.
+
+    Args:
+        source (str): Ścieżka do pliku lub adres URL strumienia.
+
+    Returns:
+        cv2.VideoCapture: Obiekt przechwytywania (należy sprawdzić isOpened()).
+    """
+    import cv2  # Import przy pierwszym użyciu - skraca start okna Launchera
+    is_stream = "://" in str(source)
+    api = cv2.CAP_FFMPEG if is_stream or sys.platform != 'win32' else cv2.CAP_MSMF
+    # Parametry otwarcia (OpenCV >= 4.5.2) - po otwarciu akceleracji nie da się już włączyć
+    hw_params = []
+    if hasattr(cv2, 'CAP_PROP_HW_ACCELERATION'):
+        hw_params = [cv2.CAP_PROP_HW_ACCELERATION, cv2.VIDEO_ACCELERATION_ANY]
+    try:
+        cap = cv2.VideoCapture(source, api, hw_params)
+    except (cv2.error, TypeError):
+        cap = cv2.VideoCapture(source, api)
+    if not cap.isOpened() and not is_stream:
+        cap = cv2.VideoCapture(source)
+    return cap
+
+def grab_png_from_source(video_source):
+    """
+    Pobiera pojedynczą klatkę ze źródła wideo (plik lokalny, YouTube, RTSP, HTTP)
+    i od razu koduje ją do PNG. Klatki o dłuższym boku ponad MAX_REFERENCE_EDGE są
+    pomniejszane (INTER_AREA) - obraz służy tylko do ręcznego rysowania miejsc.
+
+    Nie korzysta z tkinter, więc może działać w wątku roboczym - razem z kodowaniem,
+    które dla klatek Full HD trwa setki milisekund.
 
     Args:
         video_source (str): Ścieżka do pliku wideo lub adres URL strumienia.
-        lot_name_prefix (str): Nazwa projektu używana jako podstawa nazwy pliku.
 
     Returns:
-        str|None: Ścieżka do zapisanego pliku .png lub None w przypadku niepowodzenia.
+        tuple: (dane PNG jako bytes, skala, None) lub (None, None, (tytuł, treść komunikatu błędu)).
+            Skala (<= 1.0) to stosunek rozmiaru obrazu do rozmiaru klatki źródła.
     """
     cap = None
+    # Opcje FFmpeg ustawiane tylko na czas tego otwarcia - podprogramy (np. monitoring)
+    # działają w tym samym procesie i nie mogą ich dziedziczyć
+    prev_ffmpeg_opts = os.environ.get('OPENCV_FFMPEG_CAPTURE_OPTIONS')
+    ffmpeg_opts_set = False
     try:
+        import cv2  # Import przy pierwszym użyciu - skraca start okna Launchera
         final_source = get_direct_youtube_url(video_source)
-        cap = cv2.VideoCapture(final_source, cv2.CAP_FFMPEG)
-        if not cap.isOpened():
-            cap = cv2.VideoCapture(final_source)
-        
+        if "rtsp" in str(final_source).lower():
+            # RTSP po TCP (bez zgubionych pakietów UDP) i z małym buforem odbioru
+            os.environ['OPENCV_FFMPEG_CAPTURE_OPTIONS'] = 'rtsp_transport;tcp|buffer_size;65536'
+            ffmpeg_opts_set = True
+        cap = open_video_capture(final_source)
         if not cap.isOpened():
-            show_topmost_message("Błąd", f"Nie można otworzyć źródła: {video_source}", is_error=True)
-            return None
-        
-        ret, frame = cap.read()
+            return None, None, ("Błąd", f"Nie można otworzyć źródła: {video_source}")
+
+        # Bufor 1 klatki: pierwszy odczyt zwraca najświeższą klatkę, a nie kolejkę sprzed kilku sekund
+        try: cap.set(cv2.CAP_PROP_BUFFERSIZE, 1)
+        except Exception: pass
+
+        # grab() tylko przesuwa dekoder (bez konwersji do BGR); klatkę materializuje retrieve()
+        warmup = STREAM_WARMUP_FRAMES if "://" in str(final_source) else 0
+        for _ in range(warmup):
+            if not cap.grab(): break
+        ret = cap.grab()
         if ret:
-            safe_name = "".join([c if c.isalnum() or c in (' ', '_', '-') else "" for c in lot_name_prefix]).strip().replace(' ', '_')
-            filename = f"{safe_name}.png"
-            filepath = IMG_DIR / filename
-            
-            if filepath.exists():
-                root = tk.Tk(); root.withdraw(); root.attributes("-topmost", True)
-                response = messagebox.askyesnocancel(
-                    "Plik istnieje", 
-                    f"Plik '{filename}' już istnieje.\n\nTAK - Nadpisz\nNIE - Dodaj datę\nANULUJ - Przerwij",
-                    parent=root
-                )
-                root.destroy()
-                if response is None: return None
-                elif response is False:
-                    timestamp = datetime.datetime.now().strftime("%Y%m%d_%H%M%S")
-                    filename = f"{safe_name}_{timestamp}.png"
-                    filepath = IMG_DIR / filename
-            
-            cv2.imwrite(str(filepath), frame)
-            return str(filepath)
-        else:
-            show_topmost_message("Błąd", "Nie udało się pobrać klatki (strumień pusty).", is_error=True)
-            return None
+            ret, frame = cap.retrieve()
+        if not ret:
+            return None, None, ("Błąd", "Nie udało się pobrać klatki (strumień pusty).")
+
+        h, w = frame.shape[:2]
+        scale = min(1.0, MAX_REFERENCE_EDGE / max(h, w))
+        if scale < 1.0:
+            frame = cv2.resize(frame, None, fx=scale, fy=scale, interpolation=cv2.INTER_AREA)
+        # Poziom 1: kompresja PNG powyżej niego jest wielokrotnie wolniejsza przy niewielkim zysku
+        ok, png = cv2.imencode('.png', frame, [cv2.IMWRITE_PNG_COMPRESSION, 1])
+        if not ok:
+            return None, None, ("Błąd", "Nie udało się zakodować klatki do PNG.")
+        return png.tobytes(), scale, None
     except Exception as e:
-        show_topmost_message("Wyjątek", f"Błąd OpenCV: {e}", is_error=True)
-        return None
+        return None, None, ("Wyjątek", f"Błąd OpenCV: {e}")
     finally:
         if cap: cap.release()
+        if ffmpeg_opts_set:
+            if prev_ffmpeg_opts is None:
+                os.environ.pop('OPENCV_FFMPEG_CAPTURE_OPTIONS', None)
+            else:
+                os.environ['OPENCV_FFMPEG_CAPTURE_OPTIONS'] = prev_ffmpeg_opts
+
+def save_reference_frame(png_data, lot_name_prefix):
+    """
+    Zapisuje zakodowaną klatkę jako obraz referencyjny PNG w katalogu źródłowym obrazów.
+
+    Jeśli plik o tej nazwie istnieje, pyta o nadpisanie lub dopisanie daty.
+
+    Args:
+        png_data (bytes): Klatka zakodowana do PNG (grab_png_from_source).
+        lot_name_prefix (str): Nazwa projektu używana jako podstawa nazwy pliku.
+
+    Returns:
+        str|None: Ścieżka do zapisanego pliku .png lub None, jeśli przerwano.
+    """
+    safe_name = UNSAFE_NAME_CHARS.sub('', lot_name_prefix).strip().replace(' ', '_')
+    filename = f"{safe_name}.png"
+    filepath = IMG_DIR / filename
+    
+    if filepath.exists():
+        response = messagebox.askyesnocancel(
+            "Plik istnieje", 
+            f"Plik '{filename}' już istnieje.\n\nTAK - Nadpisz\nNIE - Dodaj datę\nANULUJ - Przerwij",
+            parent=_hidden_root()
+        )
+        if response is None: return None
+        elif response is False:
+            import datetime
+            timestamp = datetime.datetime.now().strftime("%Y%m%d_%H%M%S")
+            filename = f"{safe_name}_{timestamp}.png"
+            filepath = IMG_DIR / filename
+    
+    try:
+        filepath.write_bytes(png_data)
+    except OSError as e:
+        show_topmost_message("Wyjątek", f"Błąd zapisu pliku: {e}", is_error=True)
+        return None
+    return str(filepath)
+
+def capture_frame_from_source(video_source, lot_name_prefix):
+    """
+    Pobiera pojedynczą klatkę ze źródła wideo i zapisuje ją jako obraz referencyjny PNG.
+
+    Obsługuje pliki lokalne oraz strumienie sieciowe (YouTube, RTSP, HTTP) przy użyciu OpenCV.
+
+    Args:
+        video_source (str): Ścieżka do pliku wideo lub adres URL strumienia.
+        lot_name_prefix (str): Nazwa projektu używana jako podstawa nazwy pliku.
+
+    Returns:
+        str|None: Ścieżka do zapisanego pliku .png lub None w przypadku niepowodzenia.
+    """
+    png_data, _, error = grab_png_from_source(video_source)
+    if png_data is None:
+        show_topmost_message(*error, is_error=True)
+        return None
+    return save_reference_frame(png_data, lot_name_prefix)
 
 def delete_parking_lot(lot_name):
     """
@@ -204,8 +399,7 @@ def delete_parking_lot(lot_name):
     """
     if not CONFIG_FILE.exists(): return False
     try:
-        with open(CONFIG_FILE, 'r', encoding='utf-8') as f:
-            data = json.load(f)
+        data = copy.deepcopy(_read_config())
         
         if lot_name in data["parking_lots"]:
             pos_file = data["parking_lots"][lot_name].get("positions_file", "")
@@ -216,114 +410,144 @@ def delete_parking_lot(lot_name):
                 except OSError: pass
 
             del data["parking_lots"][lot_name]
-            with open(CONFIG_FILE, 'w', encoding='utf-8') as f:
-                json.dump(data, f, indent=4)
+            _write_config(data)
             return True
     except Exception:
         return False
     return False
 
-def open_config_editor(root, lot_name):
+# Okno edycji konfiguracji - budowane raz na okno główne, potem tylko ukrywane i pokazywane
+_config_editor = {"win": None, "header": None, "entries": None, "lot_name": None}
+
+def _build_config_editor(root):
     """
-    Wyświetla okno edycji parametrów technicznych zapisanego projektu.
+    Tworzy (ukryte) okno edycji konfiguracji wraz z formularzem.
 
-    Umożliwia zmianę źródła wideo, obrazu referencyjnego, wymiarów miejca i progu detekcji.
+    Pola są powiązane ze zmiennymi StringVar, które open_config_editor wypełnia
+    danymi wybranego parkingu przy każdym otwarciu.
 
     Args:
         root (tk.Tk): Obiekt nadrzędny dla okna modalnego (Toplevel).
-        lot_name (str): Nazwa parkingu pobrana z listy konfiguracji.
-    """
-    if not CONFIG_FILE.exists(): return
-    with open(CONFIG_FILE, 'r', encoding='utf-8') as f:
-        full_config = json.load(f)
-    
-    lot_data = full_config["parking_lots"].get(lot_name)
-    if not lot_data: return
 
+    Returns:
+        tk.Toplevel: Utworzone okno edycji.
+    """
     edit_win = tk.Toplevel(root)
-    edit_win.title(f"Edycja: {lot_name}")
+    edit_win.withdraw()
     edit_win.geometry("600x480")
     edit_win.configure(bg=COLOR_BG)
-    edit_win.grab_set()
 
-    tk.Label(edit_win, text=f"Konfiguracja: {lot_name}", font=("Segoe UI", 12, "bold"), bg=COLOR_BG).pack(pady=10)
+    header = tk.Label(edit_win, font=FONT_DIALOG_HEADER, bg=COLOR_BG)
+    header.pack(pady=10)
     form_frame = tk.Frame(edit_win, bg=COLOR_BG)
     form_frame.pack(fill="both", expand=True, padx=20)
 
     entries = {}
 
-    def add_field(label_text, key, read_only=False, is_path=False):
+    def add_field(label_text, key, read_only=False):
         """Pomocnicza funkcja generująca wiersz formularza edycji."""
         row = tk.Frame(form_frame, bg=COLOR_BG)
         row.pack(fill="x", pady=5)
         tk.Label(row, text=label_text, width=20, anchor="w", bg=COLOR_BG).pack(side="left")
-        raw_val = lot_data.get(key, "")
-        display_val = make_relative(str(raw_val)) if is_path else str(raw_val)
-        var = tk.StringVar(value=display_val)
+        var = tk.StringVar(edit_win)
         entry = ttk.Entry(row, textvariable=var)
         entry.pack(side="left", fill="x", expand=True)
         if read_only: entry.config(state="readonly")
         entries[key] = var
+        return row
 
     # Pola formularza
     add_field("Nazwa (ID):", "name", read_only=True)
 
-    row_src = tk.Frame(form_frame, bg=COLOR_BG)
-    row_src.pack(fill="x", pady=5)
-    tk.Label(row_src, text="Źródło (Plik/URL):", width=20, anchor="w", bg=COLOR_BG).pack(side="left")
-    val_src = lot_data.get("video_source", "")
-    var_src = tk.StringVar(value=make_relative(val_src))
-    ent_src = ttk.Entry(row_src, textvariable=var_src)
-    ent_src.pack(side="left", fill="x", expand=True)
+    row_src = add_field("Źródło (Plik/URL):", "video_source")
     
     def browse_source():
         """Otwiera eksplorator plików dla wyboru źródła wideo."""
-        f = filedialog.askopenfilename(title="Wybierz wideo", initialdir=str(VIDEO_DIR), 
+        f = filedialog.askopenfilename(title="Wybierz wideo", initialdir=VIDEO_DIR_STR, 
                                        filetypes=(("Wideo", "*.mp4 *.avi"), ("Wszystkie", "*.*")))
-        if f: var_src.set(make_relative(f))
+        if f: entries["video_source"].set(make_relative(f))
             
     ttk.Button(row_src, text="...", width=3, command=browse_source).pack(side="right", padx=(5,0))
-    entries["video_source"] = var_src
 
     add_field("Szerokość miejsca:", "rect_width")
     add_field("Wysokość miejsca:", "rect_height")
     add_field("Czułość (Threshold):", "threshold")
     
-    row_ref = tk.Frame(form_frame, bg=COLOR_BG)
-    row_ref.pack(fill="x", pady=5)
-    tk.Label(row_ref, text="Obraz Bazowy:", width=20, anchor="w", bg=COLOR_BG).pack(side="left")
-    val_ref = lot_data.get("source_image", "")
-    var_ref = tk.StringVar(value=make_relative(val_ref))
-    ent_ref = ttk.Entry(row_ref, textvariable=var_ref)
-    ent_ref.pack(side="left", fill="x", expand=True)
+    row_ref = add_field("Obraz Bazowy:", "source_image")
     
     def browse_ref():
         """Otwiera eksplorator plików dla wyboru obrazu referencyjnego."""
-        f = filedialog.askopenfilename(title="Wybierz obraz bazowy", initialdir=str(IMG_DIR))
-        if f: var_ref.set(make_relative(f))
+        f = filedialog.askopenfilename(title="Wybierz obraz bazowy", initialdir=IMG_DIR_STR)
+        if f: entries["source_image"].set(make_relative(f))
             
     ttk.Button(row_ref, text="...", width=3, command=browse_ref).pack(side="right", padx=(5,0))
-    entries["source_image"] = var_ref
+
+    def hide():
+        """Ukrywa okno zamiast je niszczyć - kolejne otwarcie tylko wypełnia pola."""
+        edit_win.grab_release()
+        edit_win.withdraw()
 
     def save_changes():
         """Waliduje i zapisuje wprowadzone zmiany do głównego pliku JSON."""
+        lot_name = _config_editor["lot_name"]
         try:
             w, h, t = int(entries["rect_width"].get()), int(entries["rect_height"].get()), int(entries["threshold"].get())
+            full_config = copy.deepcopy(_read_config())
+            lot_data = full_config["parking_lots"].get(lot_name, {})
             lot_data.update({
                 "video_source": entries["video_source"].get(),
                 "source_image": entries["source_image"].get(),
                 "rect_width": w, "rect_height": h, "threshold": t
             })
             full_config["parking_lots"][lot_name] = lot_data
-            with open(CONFIG_FILE, 'w', encoding='utf-8') as f:
-                json.dump(full_config, f, indent=4)
+            _write_config(full_config)
+            make_relative.cache_clear()
             messagebox.showinfo("Sukces", "Zapisano zmiany!", parent=edit_win)
-            edit_win.destroy()
+            hide()
         except ValueError:
             messagebox.showerror("Błąd", "Wymiary muszą być liczbami!", parent=edit_win)
 
     tk.Button(edit_win, text="💾 ZAPISZ ZMIANY", bg=COLOR_SUCCESS, fg="white", 
-              font=("Segoe UI", 10, "bold"), command=save_changes).pack(pady=20, ipadx=20)
+              font=FONT_BOLD, command=save_changes).pack(pady=20, ipadx=20)
+    edit_win.protocol("WM_DELETE_WINDOW", hide)
+
+    _config_editor.update(win=edit_win, header=header, entries=entries)
+    return edit_win
+
+def open_config_editor(root, lot_name):
+    """
+    Wyświetla okno edycji parametrów technicznych zapisanego projektu.
+
+    Umożliwia zmianę źródła wideo, obrazu referencyjnego, wymiarów miejca i progu detekcji.
+    Okno jest tworzone przy pierwszym otwarciu, a później tylko ponownie wypełniane.
+
+    Args:
+        root (tk.Tk): Obiekt nadrzędny dla okna modalnego (Toplevel).
+        lot_name (str): Nazwa parkingu pobrana z listy konfiguracji.
+    """
+    if not CONFIG_FILE.exists(): return
+    lot_data = _read_config()["parking_lots"].get(lot_name)
+    if not lot_data: return
+
+    edit_win = _config_editor["win"]
+    try:
+        reusable = edit_win is not None and edit_win.master is root and edit_win.winfo_exists()
+    except tk.TclError:
+        reusable = False
+    if not reusable:
+        edit_win = _build_config_editor(root)
+
+    _config_editor["lot_name"] = lot_name
+    edit_win.title(f"Edycja: {lot_name}")
+    _config_editor["header"].config(text=f"Konfiguracja: {lot_name}")
+    entries = _config_editor["entries"]
+    for key in ("name", "rect_width", "rect_height", "threshold"):
+        entries[key].set(str(lot_data.get(key, "")))
+    for key in ("video_source", "source_image"):
+        entries[key].set(make_relative(lot_data.get(key, "")))
+
+    edit_win.deiconify()
+    edit_win.grab_set()
 
 def gui_main_menu():
     """
@@ -341,19 +565,13 @@ def gui_main_menu():
     root.geometry(f'{w}x{h}+{int((ws/2)-(w/2))}+{int((hs/2)-(h/2))}')
     root.configure(bg=COLOR_BG)
 
-    style = ttk.Style()
-    style.theme_use('clam')
-    style.configure("TButton", font=FONT_MAIN, padding=6, relief="flat")
-    style.configure("Run.TButton", background=COLOR_SUCCESS, foreground="white", font=("Segoe UI", 10, "bold"))
-    style.map("Run.TButton", background=[("active", "#219150")])
-    style.configure("Create.TButton", background=COLOR_ACCENT, foreground="white", font=("Segoe UI", 10, "bold"))
-    style.map("Create.TButton", background=[("active", "#2980b9")])
+    init_styles(root)
 
-    def save_temp_url(url):
-        """Zapisuje adres URL do pliku tymczasowego dla modułu konfiguracji."""
+    def save_temp_url(url, scale=1.0):
+        """Zapisuje adres URL (i skalę obrazu względem klatek źródła) dla modułu konfiguracji."""
         try:
             with open(TEMP_URL_FILE, 'w', encoding='utf-8') as f:
-                json.dump({"url": url}, f)
+                json.dump({"url": url, "scale": scale}, f)
         except Exception: pass
 
     def clear_temp_url():
@@ -375,10 +593,10 @@ def gui_main_menu():
 
     # Panel lewy: Zapisane konfiguracje
     left_frame = tk.LabelFrame(main_frame, text=" ✅ Zapisane Konfiguracje ", 
-                               bg=COLOR_BG, font=("Segoe UI", 11, "bold"), fg=COLOR_SUCCESS)
+                               bg=COLOR_BG, font=FONT_SECTION, fg=COLOR_SUCCESS)
     left_frame.pack(side="left", fill="both", expand=True, padx=(0, 10))
     
-    list_saved = tk.Listbox(left_frame, font=("Consolas", 11), bg=COLOR_LIST_BG, 
+    list_saved = tk.Listbox(left_frame, font=FONT_LIST, bg=COLOR_LIST_BG, 
                             selectbackground=COLOR_SUCCESS, borderwidth=0, highlightthickness=1, relief="solid")
     list_saved.pack(side="left", fill="both", expand=True, padx=10, pady=10)
 
@@ -387,7 +605,7 @@ def gui_main_menu():
         list_saved.delete(0, tk.END)
         saved_lots = load_config_list()
         if saved_lots:
-            for lot in saved_lots: list_saved.insert(tk.END, f"🅿 {lot}")
+            list_saved.insert(tk.END, *(f"🅿 {lot}" for lot in saved_lots))
         else:
             list_saved.insert(tk.END, "(Brak konfiguracji)")
     refresh_saved_list()
@@ -443,12 +661,12 @@ def gui_main_menu():
 
     # Panel prawy: Nowy projekt
     right_frame = tk.LabelFrame(main_frame, text=" 📂 Nowy Projekt (Obrazy) ", 
-                                bg=COLOR_BG, font=("Segoe UI", 11, "bold"), fg=COLOR_ACCENT)
+                                bg=COLOR_BG, font=FONT_SECTION, fg=COLOR_ACCENT)
     right_frame.pack(side="right", fill="both", expand=True, padx=(10, 0))
     
     tk.Label(right_frame, text="Wybierz obraz z listy poniżej:", bg=COLOR_BG, 
-             fg="#7f8c8d", font=("Segoe UI", 9)).pack(anchor="w", padx=10, pady=(5,0))
-    list_raw = tk.Listbox(right_frame, font=("Consolas", 11), bg=COLOR_LIST_BG, 
+             fg="#7f8c8d", font=FONT_HINT).pack(anchor="w", padx=10, pady=(5,0))
+    list_raw = tk.Listbox(right_frame, font=FONT_LIST, bg=COLOR_LIST_BG, 
                           selectbackground=COLOR_ACCENT, borderwidth=0, highlightthickness=1, relief="solid")
     list_raw.pack(side="left", fill="both", expand=True, padx=10, pady=(5, 10))
 
@@ -456,8 +674,10 @@ def gui_main_menu():
         """Odświeża listę dostępnych plików obrazów w folderze źródłowym."""
         list_raw.delete(0, tk.END)
         if IMG_DIR.exists():
-            files = sorted([f for f in os.listdir(IMG_DIR) if f.lower().endswith(('.png', '.jpg', '.jpeg'))])
-            for f in files: list_raw.insert(tk.END, f"📄 {f}")
+            with os.scandir(IMG_DIR) as it:
+                files = sorted(e.name for e in it
+                               if os.path.splitext(e.name)[1].lower() in IMAGE_EXTS and e.is_file(follow_symlinks=False))
+            if files: list_raw.insert(tk.END, *(f"📄 {f}" for f in files))
         else: list_raw.insert(tk.END, "Brak img")
     refresh_raw_list()
 
@@ -494,7 +714,7 @@ def gui_main_menu():
             sel = list_raw.curselection()[0]
             filename = list_raw.get(sel).replace("📄 ", "")
             clear_temp_url()
-            selection["action"] = "create"; selection["data"] = str(IMG_DIR / filename); root.destroy()
+            selection["action"] = "create"; selection["data"] = os.path.join(IMG_DIR_STR, filename); root.destroy()
         except IndexError: messagebox.showwarning("Wybór", "Wybierz obraz z listy!", parent=root)
 
     def on_url():
@@ -505,17 +725,39 @@ def gui_main_menu():
             if name:
                 loading = tk.Toplevel(root)
                 loading.title("Pobieranie..."); loading.geometry("300x100")
-                tk.Label(loading, text="⏳ Pobieranie klatki ze źródła...").pack(expand=True)
-                loading.update()
-                path = capture_frame_from_source(url, name)
-                loading.destroy() 
-                if path:
-                    save_temp_url(url)
-                    selection["action"] = "create"; selection["data"] = path; root.destroy()
+                loading.transient(root); loading.grab_set()
+                status = tk.Label(loading, text="⏳ Pobieranie klatki ze źródła")
+                status.pack(expand=True)
+
+                # Otwarcie strumienia trwa nawet kilkanaście sekund - robi to wątek roboczy,
+                # a okno tylko odpytuje kolejkę (wątek nie dotyka widżetów Tk)
+                results = queue.Queue()
+                threading.Thread(target=lambda: results.put(grab_png_from_source(url)), daemon=True).start()
+                ticks = [0]
+
+                def poll():
+                    """Sprawdza wynik pobierania co 50 ms i animuje komunikat oczekiwania."""
+                    if not loading.winfo_exists(): return  # Anulowano zamknięciem okna
+                    try:
+                        png_data, scale, error = results.get_nowait()
+                    except queue.Empty:
+                        ticks[0] += 1
+                        status.config(text="⏳ Pobieranie klatki ze źródła" + "." * (ticks[0] // 5 % 4))
+                        loading.after(50, poll)
+                        return
+                    loading.destroy()
+                    if png_data is None:
+                        messagebox.showerror(error[0], error[1], parent=root)
+                        return
+                    path = save_reference_frame(png_data, name)
+                    if path:
+                        save_temp_url(url, scale)
+                        selection["action"] = "create"; selection["data"] = path; root.destroy()
+                loading.after(50, poll)
     
     def on_browse():
         """Pozwala zaimportować plik graficzny z dowolnej lokalizacji na dysku."""
-        path = filedialog.askopenfilename(initialdir=str(IMG_DIR), title="Wybierz plik", 
+        path = filedialog.askopenfilename(initialdir=IMG_DIR_STR, title="Wybierz plik", 
                                           filetypes=(("Obrazy", "*.png *.jpg"), ("Wszystkie", "*.*")))
         if path:
             clear_temp_url(); selection["action"] = "create"; selection["data"] = path; root.destroy()
@@ -530,29 +772,120 @@ def gui_main_menu():
     root.mainloop()
     return selection
 
+def wait_for_process(proc, title):
+    """
+    Czeka na zakończenie procesu podrzędnego, wyświetlając okno statusu z przyciskiem "Anuluj".
+
+    Stan procesu jest sprawdzany co 200 ms (after), więc okno pozostaje responsywne,
+    a anulowanie kończy proces przez terminate().
+
+    Args:
+        proc (subprocess.Popen): Uruchomiony proces podrzędny.
+        title (str): Nazwa podprogramu wyświetlana w oknie.
+
+    Returns:
+        int: Kod wyjścia procesu (niezerowy po anulowaniu).
+    """
+    win = tk.Toplevel(_hidden_root())
+    win.title("Praca w toku"); win.geometry("320x110")
+    win.attributes("-topmost", True)
+    tk.Label(win, text=f"⏳ Uruchomiono: {title}", font=FONT_MAIN).pack(expand=True)
+
+    def cancel():
+        """Przerywa proces podrzędny; okno zamknie się przy następnym sprawdzeniu."""
+        if proc.poll() is None: proc.terminate()
+
+    def poll():
+        """Sprawdza co 200 ms, czy proces się zakończył."""
+        if proc.poll() is None: win.after(200, poll)
+        else: win.destroy()
+
+    ttk.Button(win, text="Anuluj", command=cancel).pack(pady=(0, 10))
+    win.protocol("WM_DELETE_WINDOW", cancel)
+    win.after(200, poll)
+    win.wait_window()
+    return proc.wait()
+
+def run_stage(module_name, args, check=False):
+    """
+    Uruchamia podprogram (app, car_park_coordinate_generator, add_parking_config).
+
+    Moduł jest importowany raz i wywoływany przez jego main(argv) w bieżącym procesie -
+    bez startu nowego interpretera i ponownego importu cv2/numpy. Jeśli modułu nie da
+    się zaimportować, skrypt uruchamiany jest jako osobny proces, a Launcher pokazuje
+    w tym czasie okno statusu z możliwością anulowania (wait_for_process).
+
+    Args:
+        module_name (str): Nazwa modułu/skryptu bez rozszerzenia .py.
+        args (list): Argumenty wiersza poleceń podprogramu.
+        check (bool): Jeśli True, niezerowy kod wyjścia zgłasza CalledProcessError.
+
+    Returns:
+        int: Kod wyjścia podprogramu (0 = sukces).
+    """
+    try:
+        module = importlib.import_module(module_name)
+    except ImportError:
+        module = None
+
+    if module is None:
+        proc = subprocess.Popen([sys.executable, f"{module_name}.py", *args], cwd=BASE_DIR_STR)
+        returncode = wait_for_process(proc, module_name)
+    else:
+        # Podprogramy korzystają ze ścieżek względnych wobec katalogu projektu
+        prev_cwd = os.getcwd()
+        os.chdir(BASE_DIR)
+        try:
+            module.main(args)
+            returncode = 0
+        except SystemExit as e:
+            returncode = e.code if isinstance(e.code, int) else (0 if e.code is None else 1)
+        finally:
+            os.chdir(prev_cwd)
+
+    if check and returncode != 0:
+        raise subprocess.CalledProcessError(returncode, module_name)
+    return returncode
+
+def find_missing_stages():
+    """
+    Sprawdza jednym przebiegiem scandir, czy w katalogu projektu są wszystkie skrypty
+    podprogramów - brak wychodzi na starcie, a nie w połowie kreatora nowego parkingu.
+
+    Returns:
+        list: Nazwy brakujących plików (pusta lista, jeśli wszystkie są na miejscu).
+    """
+    with os.scandir(BASE_DIR_STR) as it:
+        present = {e.name for e in it if e.is_file()}
+    return [name for name in STAGE_SCRIPTS if name not in present]
+
 def main():
     """
     Główna pętla sterująca cyklem życia aplikacji.
     
     Interpretuje wyniki wybrane w GUI (gui_main_menu) i wywołuje odpowiednie
     podprogramy (app.py, car_park_coordinate_generator.py, add_parking_config.py)
-    używając mechanizmu subprocess.
+    w bieżącym procesie (run_stage).
     """
+    missing = find_missing_stages()
+    if missing:
+        show_topmost_message("Błąd Krytyczny",
+            "Brak plików programu w katalogu projektu:\n" + "\n".join(missing), is_error=True)
+        sys.exit(1)
+
     while True:
         sel = gui_main_menu()
         action, data = sel["action"], sel["data"]
         if not action: sys.exit(0)
-        cwd_path = str(BASE_DIR)
 
         try:
             if action == "run":
                 # Uruchomienie głównego systemu detekcji
-                subprocess.run([sys.executable, "app.py", "--lot", data], cwd=cwd_path, check=True)
+                run_stage("app", ["--lot", data], check=True)
 
             elif action == "edit":
                 # 1. Pobierz ścieżki z konfiguracji
-                with open(CONFIG_FILE, 'r', encoding='utf-8') as f:
-                    config_data = json.load(f)
+                config_data = _read_config()
                 
                 lot_info = config_data["parking_lots"].get(data, {})
                 img_path = BASE_DIR / lot_info.get("source_image", "")
@@ -567,56 +900,43 @@ def main():
 
                 # 3. Jeśli plik pozycji nie istnieje, uprzedź użytkownika
                 if not pos_path.exists():
-                    root = tk.Tk(); root.withdraw(); root.attributes("-topmost", True)
                     messagebox.showinfo("Nowa Geometria", 
                         f"Konfiguracja miejsc dla '{data}' nie istnieje.\n"
-                        "Zostanie teraz otwarty edytor, abyś mógł narysować je od zera.", parent=root)
-                    root.destroy()
+                        "Zostanie teraz otwarty edytor, abyś mógł narysować je od zera.", parent=_hidden_root())
 
                 # 4. Uruchom edytor
-                result = subprocess.run([sys.executable, "car_park_coordinate_generator.py", "--lot", data], 
-                               cwd=cwd_path)
+                returncode = run_stage("car_park_coordinate_generator", ["--lot", data])
                 
                 # 5. Sprawdź efekt końcowy
-                if result.returncode == 0 and pos_path.exists():
-                    root = tk.Tk(); root.withdraw(); root.attributes("-topmost", True)
-                    if messagebox.askyesno("Gotowe", f"Zapisano geometrię dla '{data}'. Uruchomić monitoring?", parent=root):
-                        root.destroy(); subprocess.run([sys.executable, "app.py", "--lot", data], cwd=cwd_path, check=True)
-                    else: root.destroy()
-                elif result.returncode != 0:
+                if returncode == 0 and pos_path.exists():
+                    if messagebox.askyesno("Gotowe", f"Zapisano geometrię dla '{data}'. Uruchomić monitoring?", parent=_hidden_root()):
+                        run_stage("app", ["--lot", data], check=True)
+                elif returncode != 0:
                     show_topmost_message("Błąd", "Wystąpił problem techniczny podczas uruchamiania edytora.", is_error=True)
             
             elif action == "create":
                 # Sekwencja kreatora nowego parkingu
                 image_path = data
                 default_name = os.path.splitext(os.path.basename(image_path))[0].lower().replace(' ', '_')
-                root = tk.Tk(); root.withdraw(); root.attributes("-topmost", True)
                 lot_name = simpledialog.askstring("Krok 1/4: Nazwa", "Podaj unikalną nazwę projektu:", 
-                                                  initialvalue=default_name, parent=root)
-                root.destroy()
+                                                  initialvalue=default_name, parent=_hidden_root())
                 if not lot_name: continue
 
                 # Krok 2: Kalibracja skali
-                subprocess.run([sys.executable, "car_park_coordinate_generator.py", "--lot", "empty_calibration", 
-                                "--image", image_path, "--mode", "c"], cwd=cwd_path, check=True)
+                run_stage("car_park_coordinate_generator",
+                          ["--lot", "empty_calibration", "--image", image_path, "--mode", "c"], check=True)
                 
                 # Krok 3: Konfiguracja parametrów JSON
-                subprocess.run([sys.executable, "add_parking_config.py", "--default_name", lot_name, 
-                                "--image_path", image_path], cwd=cwd_path, check=True)
+                run_stage("add_parking_config", ["--default_name", lot_name, "--image_path", image_path], check=True)
                 
                 # Krok 4: Interaktywne rysowanie
                 real_lot_name = get_last_added_lot_name()
                 if real_lot_name == lot_name:
-                    root = tk.Tk(); root.withdraw(); root.attributes("-topmost", True)
-                    do_draw = messagebox.askyesno("Krok 4/4: Rysowanie", "Konfiguracja gotowa. Czy chcesz teraz narysować miejsca?", parent=root)
-                    root.destroy()
+                    do_draw = messagebox.askyesno("Krok 4/4: Rysowanie", "Konfiguracja gotowa. Czy chcesz teraz narysować miejsca?", parent=_hidden_root())
                     if do_draw:
-                        subprocess.run([sys.executable, "car_park_coordinate_generator.py", "--lot", real_lot_name], 
-                                       cwd=cwd_path, check=True)
-                        root = tk.Tk(); root.withdraw(); root.attributes("-topmost", True)
-                        if messagebox.askyesno("Gotowe", "Czy uruchomić system monitoringu?", parent=root):
-                            root.destroy(); subprocess.run([sys.executable, "app.py", "--lot", real_lot_name], cwd=cwd_path, check=True)
-                        else: root.destroy()
+                        run_stage("car_park_coordinate_generator", ["--lot", real_lot_name], check=True)
+                        if messagebox.askyesno("Gotowe", "Czy uruchomić system monitoringu?", parent=_hidden_root()):
+                            run_stage("app", ["--lot", real_lot_name], check=True)
 
         except subprocess.CalledProcessError as e:
             show_topmost_message("Błąd procesu", f"Wystąpił błąd podczas pracy podprogramu: {e.returncode}", is_error=True)
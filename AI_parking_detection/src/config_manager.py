@@ -1,7 +1,10 @@
+import copy
 import json
 import os
 from typing import Dict, Any
 
+from src.json_io import read_json_cached, write_json_atomic
+
 class ConfigManager:
     def __init__(self, config_path: str = "config/parking_config.json"):
         self.config_path = config_path
@@ -10,8 +13,9 @@ class ConfigManager:
     def _load_config(self) -> Dict[str, Any]:
         """Load configuration from JSON file"""
         try:
-            with open(self.config_path, 'r') as f:
-                return json.load(f)
+            # Parsed once per file version and shared across instances (the launcher
+            # runs app.main repeatedly in one process); getters hand out deep copies
+            return read_json_cached(self.config_path)
         except FileNotFoundError:
             print(f"Config file not found: {self.config_path}")
             return self._create_default_config()
@@ -47,19 +51,18 @@ class ConfigManager:
         
         # Save default config
         os.makedirs(os.path.dirname(self.config_path), exist_ok=True)
-        with open(self.config_path, 'w') as f:
-            json.dump(default_config, f, indent=2)
+        write_json_atomic(self.config_path, default_config)
         
         return default_config
     
     def get_parking_lot_config(self, lot_name: str = "default") -> Dict[str, Any]:
         """Get configuration for specific parking lot"""
-        return self.config["parking_lots"].get(lot_name, 
-                                               self.config["parking_lots"]["default"])
+        return copy.deepcopy(self.config["parking_lots"].get(lot_name, 
+                                                             self.config["parking_lots"]["default"]))
     
     def get_processing_params(self) -> Dict[str, Any]:
-        """Get image processing parameters"""
-        return self.config["processing_params"]
+        """Get image processing parameters (a copy - callers override them at runtime)"""
+        return copy.deepcopy(self.config["processing_params"])
     
     def list_parking_lots(self) -> list:
         """List available parking lot configurations"""
@@ -1,14 +1,40 @@
 import cv2
-import pickle
 import numpy as np
-from typing import List, Tuple, Dict, Any
+from typing import List, Tuple, Dict, Any, Optional
 import os
 import string
 import math
 import json
+import time
+import atexit
+import weakref
+
+from src.kernels import find_spot
+from src.positions_io import load_positions, save_positions
+
+# Optional: KD-tree for nearest route point lookup
+try:
+    from scipy.spatial import cKDTree
+except ImportError:
+    cKDTree = None
 
 CALIBRATION_OUTPUT_FILE = "config/temp_calibration_data.json"
 
+# Edits made within this window (seconds) are written to disk in a single save
+SAVE_DEBOUNCE_S = 0.3
+
+# Live instances; their coalesced saves are flushed when the interpreter exits
+_live_denoters = weakref.WeakSet()
+
+def _flush_live_denoters():
+    for denoter in list(_live_denoters):
+        denoter.flush()
+
+atexit.register(_flush_live_denoters)
+
+# Key codes accepted in the ID text field (ASCII letters, digits, space, '-', '_'): 1 = allowed
+_ID_CHARS = bytes(1 if chr(c) in string.ascii_letters + string.digits + ' -_' else 0 for c in range(256))
+
 # === CoordinateDenoter Class (Responsible for Annotation and Configuration) ===
 class CoordinateDenoter:
     """
@@ -16,6 +42,10 @@ class CoordinateDenoter:
     Responsibilities: Managing parking positions and route points (CRUD),
     handling user interface (mouse, keyboard, temporary drawing),
     and saving calibration results.
+
+    Edits are saved with a short delay (SAVE_DEBOUNCE_S): the write happens in
+    draw_positions (the usual path), on a mode change, or in flush(). Pending edits
+    are also flushed when the instance is garbage-collected and at interpreter exit.
     """
     
     def __init__(self, 
@@ -38,6 +68,35 @@ class CoordinateDenoter:
         self.edit_target_index = -1
         self.input_buffer = ""
         self.blink_state = True
+
+        # Cached layer with positions and route points (redrawn only after changes)
+        self._overlay_cache = None
+        self._overlay_mask = None
+        self._overlay_dirty = True
+
+        # Route points as an (N, 2) array plus optional KD-tree, rebuilt lazily after the route changes
+        self._route_np = np.empty((0, 2), dtype=np.int64)
+        self._route_tree = None
+        self._route_dirty = True
+
+        # Flat (SoA) vertex buffers for click hit-testing, rebuilt after position changes
+        self._poly_flat = np.empty(0, dtype=np.float32)
+        self._poly_offsets = np.zeros(1, dtype=np.int32)
+        # Per-spot bounding boxes (N, 4) as minx, miny, maxx, maxy; True where the box is the polygon itself
+        self._bboxes = np.empty((0, 4), dtype=np.float32)
+        self._bbox_exact = np.empty(0, dtype=bool)
+        self._polys_dirty = True
+
+        # Modification time of the positions file as of the last read/save
+        self._positions_mtime = None
+
+        # Pending coalesced save: time.monotonic() deadline, or None when the file is up to date
+        self._save_deadline = None
+        _live_denoters.add(self)
+
+        # Numeric IDs in use (None = rebuild on next use) and the lowest ID that may be free
+        self._used_ids: Optional[set] = None
+        self._min_free = 1
         
         os.makedirs(os.path.dirname(car_park_positions_path), exist_ok=True)
       
@@ -55,39 +114,128 @@ class CoordinateDenoter:
         except Exception as e:
             print(f"❌ Error saving calibration results: {e}")
             
+    def invalidate_overlay(self):
+        """Marks the cached positions layer as stale (call after any external change)."""
+        self._overlay_dirty = True
+        self._route_dirty = True
+        self._polys_dirty = True
+        self._used_ids = None
+
+    @staticmethod
+    def _spot_geometry(pos: Dict[str, Any]) -> Tuple[np.ndarray, Tuple[int, int]]:
+        """Returns the int32 vertex array and integer center of a position, cached on the dict.
+
+        Keys starting with '_' are in-memory caches and are never written to the positions file.
+        Vertices are not edited in place (spots are only added or removed), so the cache stays valid.
+        """
+        center = pos.get('_center')
+        if center is None:
+            pts = pos.get('_pts_np')
+            if pts is None:
+                pts = pos['_pts_np'] = np.array(pos['points'], dtype=np.int32)
+            n = len(pts)
+            center = pos['_center'] = (int(pts[:, 0].sum()) // n, int(pts[:, 1].sum()) // n)
+        return pos['_pts_np'], center
+
+    @staticmethod
+    def _is_axis_aligned_rect(points) -> bool:
+        """True for a 4-vertex polygon whose consecutive edges are horizontal or vertical."""
+        if len(points) != 4:
+            return False
+        return all(a[0] == b[0] or a[1] == b[1] for a, b in zip(points, points[1:] + points[:1])) and \
+            len({p[0] for p in points}) == 2 and len({p[1] for p in points}) == 2
+
+    def _find_spot_at(self, x: int, y: int) -> int:
+        """Returns the index of the position containing (x, y), or -1."""
+        if self._polys_dirty:
+            polys = [list(pos['points']) for pos in self.car_park_positions]
+            lengths = np.array([len(p) for p in polys], dtype=np.int32)
+            self._poly_offsets = np.zeros(len(polys) + 1, dtype=np.int32)
+            np.cumsum(lengths, out=self._poly_offsets[1:])
+            self._poly_flat = (np.array([c for p in polys for pt in p for c in pt], dtype=np.float32)
+                               if polys else np.empty(0, dtype=np.float32))
+            if polys:
+                xs, ys = self._poly_flat[0::2], self._poly_flat[1::2]
+                starts = self._poly_offsets[:-1]
+                self._bboxes = np.stack([np.minimum.reduceat(xs, starts), np.minimum.reduceat(ys, starts),
+                                         np.maximum.reduceat(xs, starts), np.maximum.reduceat(ys, starts)], axis=1)
+            else:
+                self._bboxes = np.empty((0, 4), dtype=np.float32)
+            self._bbox_exact = np.array([self._is_axis_aligned_rect(p) for p in polys], dtype=bool)
+            self._polys_dirty = False
+
+        # Bounding-box prefilter: the polygon test runs only for the few spots whose box holds the point
+        b = self._bboxes
+        candidates = np.flatnonzero((b[:, 0] <= x) & (x <= b[:, 2]) & (b[:, 1] <= y) & (y <= b[:, 3]))
+        px, py = np.float32(x), np.float32(y)
+        for k in candidates:
+            if self._bbox_exact[k]:
+                return int(k)
+            start, end = self._poly_offsets[k], self._poly_offsets[k + 1]
+            single = np.array([0, end - start], dtype=np.int32)
+            if find_spot(px, py, self._poly_flat[2 * start:2 * end], single) == 0:
+                return int(k)
+        return -1
+
+    def _nearest_route_point(self, x: int, y: int) -> Tuple[int, float]:
+        """Returns (index, distance) of the route point closest to (x, y)."""
+        if self._route_dirty:
+            self._route_np = np.array(self.route_points, dtype=np.int64).reshape(-1, 2)
+            self._route_tree = cKDTree(self._route_np) if cKDTree is not None else None
+            self._route_dirty = False
+
+        if self._route_tree is not None:
+            dist, idx = self._route_tree.query([x, y])
+            return int(idx), float(dist)
+
+        # One vectorized pass over squared distances; sqrt only for the winner
+        d2 = (self._route_np[:, 0] - x) ** 2 + (self._route_np[:, 1] - y) ** 2
+        min_dist_index = int(d2.argmin())
+        return min_dist_index, math.sqrt(d2[min_dist_index])
+
     # --- Managing  ---
+    @staticmethod
+    def _numeric_id(spot_id) -> Optional[int]:
+        """Returns the ID as an int if it is numeric (int or digit string), else None."""
+        if isinstance(spot_id, int):
+            return spot_id
+        if isinstance(spot_id, str) and spot_id.isdigit():
+            return int(spot_id)
+        return None
+
     def _get_next_id(self) -> int:
-        """Generates the next unique numeric ID, considering gaps."""
-        if not self.car_park_positions: return 1
-            
-        existing_int_ids = set()
-        for pos in self.car_park_positions:
-            spot_id = pos.get('id')
-            try:
-                if isinstance(spot_id, str) and spot_id.isdigit():
-                    existing_int_ids.add(int(spot_id))
-                elif isinstance(spot_id, int):
-                    existing_int_ids.add(spot_id)
-            except:
-                pass 
-        
-        if not existing_int_ids: return 1
+        """Generates and reserves the next unique numeric ID, considering gaps.
 
-        sorted_ids = sorted(list(existing_int_ids))
-        
-        expected_id = 1
-        for current_id in sorted_ids:
-            if current_id > expected_id:
-                return expected_id
-            expected_id = current_id + 1
-            
-        return expected_id
+        The set of used IDs is built once (after loading or an ID edit) and then kept
+        up to date on add/remove, so a click costs an amortized O(1) scan from _min_free.
+        """
+        if self._used_ids is None:
+            ids = (self._numeric_id(pos.get('id')) for pos in self.car_park_positions)
+            self._used_ids = {i for i in ids if i is not None}
+            self._min_free = 1
+
+        next_id = self._min_free
+        while next_id in self._used_ids:
+            next_id += 1
+        # Both callers append the new position right away, so the ID is taken immediately
+        self._used_ids.add(next_id)
+        self._min_free = next_id + 1
+        return next_id
+
+    def _release_id(self, spot_id):
+        """Returns the ID of a removed position to the pool of free IDs."""
+        numeric = self._numeric_id(spot_id)
+        if numeric is not None and self._used_ids is not None:
+            self._used_ids.discard(numeric)
+            self._min_free = min(self._min_free, numeric)
     
     def set_mode(self, mode: str):
         """Set annotation mode: 'p', 'i', 't', 'e', or 'c'"""
         if mode in ['p', 'i', 't', 'e', 'c']:
+            self.flush()
             self.mode = mode
             self.irregular_points = []
+            self._overlay_dirty = True
             
             if mode == 'p': text = 'Rectangular (P)'
             elif mode == 'i': text = 'Irregular (I)'
@@ -104,24 +252,42 @@ class CoordinateDenoter:
         """Read positions from file"""
         if os.path.exists(self.car_park_positions_path):
             try:
-                with open(self.car_park_positions_path, 'rb') as f:
-                    data = pickle.load(f)
-
-                    if isinstance(data, list):
-                        self.car_park_positions = data
-                        self.route_points = []
-                    else:
-                        self.car_park_positions = data.get('car_park_positions', [])
-                        self.route_points = data.get('route_points', [])
-                    
-                    self._convert_old_format()
+                self.car_park_positions, self.route_points = load_positions(self.car_park_positions_path)
+                self._convert_old_format()
 
             except Exception as e:
                 print(f"Error reading positions: {e}")
                 self.car_park_positions = []
                 self.route_points = []
 
+        self._overlay_dirty = True
+        self._route_dirty = True
+        self._polys_dirty = True
+        self._used_ids = None
+        self._positions_mtime = self._get_positions_mtime()
         return self.car_park_positions
+
+    def _get_positions_mtime(self) -> Optional[float]:
+        """Returns the positions file modification time, or None if it does not exist."""
+        try:
+            return os.stat(self.car_park_positions_path).st_mtime
+        except OSError:
+            return None
+
+    def maybe_reload(self) -> bool:
+        """Reloads positions if the file was changed outside this instance (one stat per call).
+
+        External changes are ignored while a coalesced save is pending: the local edits
+        win and overwrite the file on the next save. Call flush() first to reload sooner.
+        """
+        if self._save_deadline is not None:
+            return False  # Unsaved local edits take precedence; they overwrite the file on flush
+        mtime = self._get_positions_mtime()
+        if mtime is None or mtime == self._positions_mtime:
+            return False
+        print(f"Positions file changed on disk, reloading: {self.car_park_positions_path}")
+        self.read_positions()
+        return True
         
     def _convert_old_format(self):
         """Convert old formats to new dict format and ensure 'id' exists."""
@@ -172,15 +338,33 @@ class CoordinateDenoter:
             print("Converted positions to new format and ensured unique IDs.")
             self.save_positions()
     
+    def _schedule_save(self):
+        """Marks positions as changed; the file is written once per SAVE_DEBOUNCE_S window."""
+        self._overlay_dirty = True
+        self._polys_dirty = True
+        if self._save_deadline is None:
+            self._save_deadline = time.monotonic() + SAVE_DEBOUNCE_S
+
+    def flush(self):
+        """Writes pending changes immediately (also run at interpreter exit and on mode changes)."""
+        if self._save_deadline is not None:
+            self.save_positions()
+
+    def __del__(self):
+        # Instance collected before exit (the atexit hook only sees live ones) - write pending edits
+        try:
+            self.flush()
+        except Exception:
+            pass
+
     def save_positions(self):
         """Save positions to file"""
-        data_to_save = {
-            'car_park_positions': self.car_park_positions,
-            'route_points': self.route_points
-        }
+        self._overlay_dirty = True
+        self._polys_dirty = True
+        self._save_deadline = None
         try:
-            with open(self.car_park_positions_path, 'wb') as f:
-                pickle.dump(data_to_save, f)
+            save_positions(self.car_park_positions_path, self.car_park_positions, self.route_points)
+            self._positions_mtime = self._get_positions_mtime()
             print(f"Saved {len(self.car_park_positions)} positions and {len(self.route_points)} route points to {self.car_park_positions_path}")
         except Exception as e:
             print(f"Error saving positions: {e}")
@@ -188,7 +372,7 @@ class CoordinateDenoter:
     # --- Interface Handling (Mouse/Keyboard/Drawing) ---
     def _handle_text_input(self, key_code: int):
         """Handles keyboard input when in ID editing state."""
-        char = chr(key_code)
+        self._overlay_dirty = True
         
         if key_code == 13: # Enter key (confirmation)
             if self.input_buffer:
@@ -213,7 +397,8 @@ class CoordinateDenoter:
                     self.car_park_positions[current_spot_index]['id'] = new_id_str
                     print(f"SUCCESS: ID updated to '{new_id_str}'.")
 
-                self.save_positions()
+                self._used_ids = None  # IDs changed arbitrarily - rebuild the set on next add
+                self._schedule_save()
             else:
                 print("ID change cancelled - input was cleared.")
             
@@ -228,15 +413,18 @@ class CoordinateDenoter:
             self.input_buffer = self.input_buffer[:-1]
             return True
 
-        elif char in string.ascii_letters or char in string.digits or char in [' ', '-', '_']:
+        elif 0 <= key_code < 256 and _ID_CHARS[key_code]:
             if len(self.input_buffer) < 20:
-                self.input_buffer += char
+                self.input_buffer += chr(key_code)
             return True
         
         return False
     
     def mouseClick(self, events: int, x: int, y: int, flags: int, params: int):
         """Mouse callback function with mode support"""
+        if events in (cv2.EVENT_LBUTTONDOWN, cv2.EVENT_RBUTTONDOWN):
+            self._overlay_dirty = True
+
         if events == cv2.EVENT_LBUTTONDOWN:
             if self.mode == 'p':
                 # Rectangular mode
@@ -252,7 +440,7 @@ class CoordinateDenoter:
                 }
                 self.car_park_positions.append(new_position)
                 print(f"Added rectangular position (ID: {new_position['id']}) at: ({x}, {y})")
-                self.save_positions()
+                self._schedule_save()
                 
             elif self.mode == 'i':
                 # Irregular mode: collect 4 points
@@ -268,23 +456,18 @@ class CoordinateDenoter:
                     self.car_park_positions.append(new_position)
                     print(f"Added irregular position with points: {self.irregular_points}")
                     self.irregular_points = []
-                    self.save_positions()
+                    self._schedule_save()
             
             elif self.mode == 't': # Route points mode
                 self.route_points.append((x, y))
+                self._route_dirty = True
                 print(f"Added route point at: ({x}, {y})")
-                self.save_positions()
+                self._schedule_save()
                 
             elif self.mode == 'e': 
                 if self.is_editing_id: return
 
-                target_spot_index = -1
-                for i, pos in enumerate(self.car_park_positions):
-                    points = pos['points']
-                    pts = np.array(points, dtype=np.int32)
-                    if cv2.pointPolygonTest(pts, (x, y), False) >= 0:
-                        target_spot_index = i
-                        break
+                target_spot_index = self._find_spot_at(x, y)
                 
                 if target_spot_index != -1:
                     self.edit_target_index = target_spot_index
@@ -317,58 +500,93 @@ class CoordinateDenoter:
                     
         elif events == cv2.EVENT_RBUTTONDOWN:
             # Remove position
-            for index, pos in enumerate(self.car_park_positions):
-                points = pos['points']
-                pts = np.array(points, dtype=np.int32)
-                if cv2.pointPolygonTest(pts, (x, y), False) >= 0:
-                    removed_pos = self.car_park_positions.pop(index)
-                    print(f"Removed position (ID: {removed_pos.get('id', 'N/A')})")
-                    self.save_positions()
-                    break
+            index = self._find_spot_at(x, y)
+            if index != -1:
+                removed_pos = self.car_park_positions.pop(index)
+                self._release_id(removed_pos.get('id'))
+                print(f"Removed position (ID: {removed_pos.get('id', 'N/A')})")
+                self._schedule_save()
                 
             if self.mode == 'i' and self.irregular_points:
                 print(f"Cancelled irregular shape (had {len(self.irregular_points)} points)")
                 self.irregular_points = []
                 
             if self.mode == 't' and self.route_points:
-                distances = [np.sqrt((px - x)**2 + (py - y)**2) for px, py in self.route_points]
-                min_dist_index = np.argmin(distances)
+                min_dist_index, min_dist = self._nearest_route_point(x, y)
 
-                if distances[min_dist_index] < 50:
+                if min_dist < 50:
                     self.route_points.pop(min_dist_index)
+                    self._route_dirty = True
                     print(f"Removed nearest route point. Remaining: {len(self.route_points)}")
-                    self.save_positions()
+                    self._schedule_save()
         
 
-    def draw_positions(self, image: np.ndarray) -> np.ndarray:
-        """Draw all positions on image, including temporary points and text input box if active."""
-        display_image = image.copy()
-        
-        # 1. Drawing existing positions
+    def _render_overlay(self, shape: Tuple[int, ...]):
+        """Renders positions and route points into the cached overlay layer."""
+        overlay = np.zeros(shape, dtype=np.uint8)
+
+        # 1. Drawing existing positions - outlines grouped by color, one polylines call per group
+        regular_polys, irregular_polys, edited_polys = [], [], []
         for i, pos in enumerate(self.car_park_positions):
-            points = pos['points']
-            is_irregular = pos.get('irregular', False)
-            spot_id = str(pos.get('id', '?'))
+            pts, _ = self._spot_geometry(pos)
 
-            color = (0, 0, 255)
-            if is_irregular: color = (255, 0, 255)
-            
             if self.is_editing_id and i == self.edit_target_index:
-                 color = (0, 255, 0) 
+                edited_polys.append(pts)
+            elif pos.get('irregular', False):
+                irregular_polys.append(pts)
+            else:
+                regular_polys.append(pts)
 
-            pts = np.array(points, dtype=np.int32)
-            cv2.polylines(display_image, [pts], True, color, 2)
-            
-            center_x = sum(p[0] for p in points) // len(points)
-            center_y = sum(p[1] for p in points) // len(points)
-            cv2.putText(display_image, spot_id, (center_x - 10, center_y), 
+        for polys, color in ((regular_polys, (0, 0, 255)), (irregular_polys, (255, 0, 255)),
+                             (edited_polys, (0, 255, 0))):
+            if polys: cv2.polylines(overlay, polys, True, color, 2)
+
+        # ID labels in a second pass, so outlines of neighbouring spots never paint over them
+        for pos in self.car_park_positions:
+            _, (center_x, center_y) = self._spot_geometry(pos)
+            spot_id = str(pos.get('id', '?'))
+            cv2.putText(overlay, spot_id, (center_x - 10, center_y), 
                         cv2.FONT_HERSHEY_SIMPLEX, 0.5, (255, 255, 255), 2)
+
+        # 4. CODE FOR ROUTE POINTS (Tryb 't') - the whole route as one open polyline
+        if self.route_points:
+            route = np.array(self.route_points, dtype=np.int32)
+            if len(route) > 1:
+                cv2.polylines(overlay, [route], False, (255, 255, 0), 2)
+            for i, point in enumerate(self.route_points):
+                cv2.circle(overlay, point, 8, (255, 255, 0), -1) 
+                cv2.putText(overlay, str(i), (point[0] + 10, point[1] - 10),
+                            cv2.FONT_HERSHEY_SIMPLEX, 0.6, (255, 255, 0), 2)
+
+        # None of the layer colors is black, so any non-zero pixel belongs to the layer
+        self._overlay_cache = overlay
+        self._overlay_mask = overlay.any(axis=2, keepdims=True)
+        self._overlay_dirty = False
+
+    def draw_positions(self, image: np.ndarray, out: Optional[np.ndarray] = None) -> np.ndarray:
+        """Draw all positions on image, including temporary points and text input box if active.
+
+        If `out` (same shape/dtype as `image`) is given, it is reused as the display buffer
+        instead of allocating a fresh copy every frame.
+        """
+        # Coalesced save - checked here because the caller redraws every frame on the UI thread
+        if self._save_deadline is not None and time.monotonic() >= self._save_deadline:
+            self.save_positions()
+
+        if out is None:
+            display_image = image.copy()
+        else:
+            np.copyto(out, image)
+            display_image = out
+
+        # 1 + 4. Positions and route points come from the cached layer
+        if self._overlay_dirty or self._overlay_cache is None or self._overlay_cache.shape != image.shape:
+            self._render_overlay(image.shape)
+        np.copyto(display_image, self._overlay_cache, where=self._overlay_mask)
         
         # 2. Drawing simulated text field (Edit ID)
         if self.is_editing_id:
-            points = self.car_park_positions[self.edit_target_index]['points']
-            center_x = sum(p[0] for p in points) // len(points)
-            center_y = sum(p[1] for p in points) // len(points)
+            _, (center_x, center_y) = self._spot_geometry(self.car_park_positions[self.edit_target_index])
             
             box_width, box_height = 160, 30
             box_start = (center_x - box_width // 2, center_y - box_height - 10)
@@ -414,16 +632,4 @@ class CoordinateDenoter:
                                  self.irregular_points[i + 1], (0, 255, 255), 1)
 
 
-        # 4. CODE FOR ROUTE POINTS (Tryb 't')
-        if self.route_points:
-            for i in range(len(self.route_points)):
-                cv2.circle(display_image, self.route_points[i], 8, (255, 255, 0), -1) 
-                cv2.putText(display_image, str(i), 
-                             (self.route_points[i][0] + 10, self.route_points[i][1] - 10),
-                             cv2.FONT_HERSHEY_SIMPLEX, 0.6, (255, 255, 0), 2)
-
-                if i > 0:
-                    cv2.line(display_image, self.route_points[i-1], 
-                             self.route_points[i], (255, 255, 0), 2)
-
         return display_image
\ No newline at end of file
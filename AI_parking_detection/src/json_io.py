@@ -0,0 +1,63 @@
+"""
+Wspólny odczyt i zapis plików konfiguracyjnych JSON.
+
+orjson jest zależnością opcjonalną (kilkukrotnie szybsze parsowanie i zapis) - bez niego
+moduł korzysta ze standardowego json. Błędy składni w obu przypadkach są
+podklasą json.JSONDecodeError.
+"""
+
+import functools
+import json
+import os
+
+try:
+    import orjson
+    ORJSON_AVAILABLE = True
+except ImportError:
+    orjson = None
+    ORJSON_AVAILABLE = False
+
+
+def loads(data):
+    """Parsuje dokument JSON podany jako bytes lub str."""
+    if ORJSON_AVAILABLE:
+        return orjson.loads(data)
+    return json.loads(data)
+
+
+def read_json(path):
+    """Wczytuje plik JSON (UTF-8) jednym odczytem."""
+    with open(path, 'rb') as f:
+        return loads(f.read())
+
+
+@functools.lru_cache(maxsize=8)
+def _read_json_version(path, mtime_ns):
+    return read_json(path)
+
+
+def read_json_cached(path):
+    """
+    Wczytuje plik JSON, parsując go ponownie tylko po zmianie czasu modyfikacji.
+    Zwracany obiekt jest współdzielony między wywołaniami - nie należy go modyfikować.
+    """
+    return _read_json_version(str(path), os.stat(path).st_mtime_ns)
+
+
+def dumps(obj, indent=True):
+    """Serializuje obiekt do bytes UTF-8 (wcięcie 2 spacje, znaki spoza ASCII bez escapowania)."""
+    if ORJSON_AVAILABLE:
+        return orjson.dumps(obj, option=orjson.OPT_INDENT_2 if indent else 0)
+    return json.dumps(obj, indent=2 if indent else None, ensure_ascii=False).encode('utf-8')
+
+
+def write_json_atomic(path, obj, indent=True):
+    """
+    Zapisuje obiekt do pliku JSON atomowo: treść trafia do pliku tymczasowego
+    obok docelowego, który następnie zastępuje oryginał (os.replace). Przerwany
+    zapis nie zostawia uszkodzonej konfiguracji.
+    """
+    tmp_path = f"{path}.tmp"
+    with open(tmp_path, 'wb') as f:
+        f.write(dumps(obj, indent))
+    os.replace(tmp_path, path)
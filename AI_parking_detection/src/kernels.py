@@ -0,0 +1,114 @@
+"""
+Kompilowane (Numba) jądra obliczeniowe dla gorących pętli detekcji.
+
+Numba jest zależnością opcjonalną - bez niej moduł nadal się importuje,
+a wywołujący sprawdzają NUMBA_AVAILABLE i wybierają ścieżkę OpenCV/NumPy.
+"""
+
+import numpy as np
+
+try:
+    from numba import njit, prange
+    NUMBA_AVAILABLE = True
+except ImportError:
+    NUMBA_AVAILABLE = False
+    prange = range
+
+    def njit(*args, **kwargs):
+        """Zastępczy dekorator: zwraca funkcję bez kompilacji."""
+        if len(args) == 1 and callable(args[0]) and not kwargs:
+            return args[0]
+        return lambda func: func
+
+
+@njit(parallel=True, cache=True)
+def count_nonzero_rois(proc, xs, ys, ws, hs, out):
+    """
+    Liczy niezerowe piksele w prostokątach (xs, ys, ws, hs) obrazu binarnego `proc`.
+    Prostokąty są przycinane do granic obrazu, wynik trafia do `out`.
+    """
+    img_h, img_w = proc.shape
+    for k in prange(xs.shape[0]):
+        x0 = max(xs[k], 0)
+        y0 = max(ys[k], 0)
+        x1 = min(xs[k] + ws[k], img_w)
+        y1 = min(ys[k] + hs[k], img_h)
+        count = 0
+        for i in range(y0, y1):
+            for j in range(x0, x1):
+                if proc[i, j] != 0:
+                    count += 1
+        out[k] = count
+
+
+@njit(cache=True)
+def find_spot(px, py, polys_flat, poly_offsets):
+    """
+    Zwraca indeks pierwszego wielokąta zawierającego punkt (px, py) albo -1.
+    Wierzchołki wszystkich wielokątów leżą w płaskim buforze `polys_flat`
+    (x0, y0, x1, y1, ...), a `poly_offsets[k]:poly_offsets[k + 1]` wyznacza
+    wierzchołki k-tego wielokąta (test parzystości przecięć). Punkt leżący na krawędzi
+    liczy się jako wewnątrz (jak cv2.pointPolygonTest(...) >= 0).
+    """
+    for k in range(poly_offsets.shape[0] - 1):
+        start = poly_offsets[k]
+        end = poly_offsets[k + 1]
+        inside = False
+        j = end - 1
+        for i in range(start, end):
+            xi = polys_flat[2 * i]
+            yi = polys_flat[2 * i + 1]
+            xj = polys_flat[2 * j]
+            yj = polys_flat[2 * j + 1]
+            # Punkt na odcinku (i, j) - test parzystości gubiłby prawą i dolną krawędź
+            if ((xj - xi) * (py - yi) == (yj - yi) * (px - xi)
+                    and min(xi, xj) <= px <= max(xi, xj) and min(yi, yj) <= py <= max(yi, yj)):
+                inside = True
+                break
+            if (yi > py) != (yj > py):
+                x_cross = (xj - xi) * (py - yi) / (yj - yi) + xi
+                if px < x_cross:
+                    inside = not inside
+            j = i
+        if inside:
+            return k
+    return -1
+
+
+@njit(cache=True, fastmath=True)
+def rotated_rect_corners(cx, cy, w, h, angle):
+    """
+    Zwraca narożniki prostokąta w × h o środku (cx, cy) obróconego o `angle` stopni,
+    jako tablicę int32 (4, 2) w kolejności: lewy-górny, prawy-górny, prawy-dolny, lewy-dolny.
+    """
+    theta = angle * np.pi / 180.0
+    cos_a = np.cos(theta)
+    sin_a = np.sin(theta)
+    hw = w / 2.0
+    hh = h / 2.0
+    out = np.empty((4, 2), np.int32)
+    for k in range(4):
+        px = hw if k == 1 or k == 2 else -hw
+        py = hh if k >= 2 else -hh
+        out[k, 0] = int(cx + px * cos_a - py * sin_a)
+        out[k, 1] = int(cy + px * sin_a + py * cos_a)
+    return out
+
+
+def points_in_polygons(px, py, polys):
+    """
+    Wektorowy (NumPy) test parzystości przecięć jednego punktu z N wielokątami
+    o tej samej liczbie wierzchołków. `polys` ma kształt (N, V, 2); zwraca bool (N,).
+    Punkt leżący na krawędzi liczy się jako wewnątrz (jak cv2.pointPolygonTest(...) >= 0).
+    """
+    xi, yi = polys[..., 0], polys[..., 1]
+    xj, yj = np.roll(xi, 1, axis=1), np.roll(yi, 1, axis=1)
+    straddle = (yi > py) != (yj > py)
+    with np.errstate(divide='ignore', invalid='ignore'):
+        x_cross = (xj - xi) * (py - yi) / (yj - yi) + xi
+    inside = np.logical_xor.reduce(straddle & (px < x_cross), axis=1)
+    # Test parzystości jest półotwarty (gubi prawą i dolną krawędź) - krawędzie sprawdzamy osobno
+    on_edge = (((xj - xi) * (py - yi) == (yj - yi) * (px - xi))
+               & (np.minimum(xi, xj) <= px) & (px <= np.maximum(xi, xj))
+               & (np.minimum(yi, yj) <= py) & (py <= np.maximum(yi, yj)))
+    return inside | on_edge.any(axis=1)
@@ -1,9 +1,10 @@
 import cv2
-import pickle
 import numpy as np
 from typing import List, Tuple, Optional, Dict, Any
 import os
 import heapq
+from src.kernels import NUMBA_AVAILABLE, count_nonzero_rois
+from src.positions_io import load_positions
 
 class ParkClassifier:
     """
@@ -42,6 +43,22 @@ class ParkClassifier:
         self.MAX_CONNECTION_DIST = 180 
         self.graph = self._build_spatial_graph(self.route_points)
 
+        # --- OPTYMALIZACJA: Stała kolejność miejsc i tablice ROI (SoA) ---
+        # Pozycje nie zmieniają się w trakcie pracy, więc sortujemy je raz,
+        # a prostokąty zapisujemy jako osobne tablice dla jądra Numba.
+        self._sorted_order = self._build_sorted_order()
+        self._roi_xs, self._roi_ys, self._roi_ws, self._roi_hs = self._build_roi_arrays()
+        self._roi_counts = np.zeros(len(self.car_park_positions), dtype=np.int32)
+        # Wielokąty miejsc jako gotowe tablice int32 oraz maski miejsc nieregularnych
+        # w ich własnym obrysie - bez alokacji pełnoklatkowej maski w każdej klatce
+        self._spot_pts = self._build_spot_polygons()
+        self._irregular_masks = self._build_irregular_masks()
+
+        # Obszar obejmujący wszystkie miejsca - tylko on jest przetwarzany w trybie ROI
+        self._roi_union = self._build_roi_union()
+        self._processed_buf = None
+        self._processed_window = None
+
         # Anti-flicker buffers
         self.stabilization_frames = 10 
         self.spot_stable_status_buffer = {}
@@ -57,12 +74,7 @@ class ParkClassifier:
             print(f"Positions file not found: {car_park_positions_path}")
             return [], []
         try:
-            with open(car_park_positions_path, 'rb') as f:
-                data = pickle.load(f)
-                if isinstance(data, list):
-                    return data, []
-                else:
-                    return data.get('car_park_positions', []), data.get('route_points', [])
+            return load_positions(car_park_positions_path)
         except Exception as e:
             print(f"Error reading positions file: {e}")
             return [], []
@@ -90,6 +102,109 @@ class ParkClassifier:
                     graph[node_b].append(node_a)
         return graph
 
+    def _build_sorted_order(self) -> List[int]:
+        """Indeksy miejsc posortowane po numerycznym ID (dla stabilności)."""
+        def sort_key(i):
+            pos = self.car_park_positions[i]
+            raw_id = pos.get('id', '99999') if isinstance(pos, dict) else '99999'
+            try: return int(raw_id)
+            except: return 99999
+        return sorted(range(len(self.car_park_positions)), key=sort_key)
+
+    def _build_roi_arrays(self) -> Tuple[np.ndarray, np.ndarray, np.ndarray, np.ndarray]:
+        """
+        Buduje tablice (x, y, w, h) prostokątów zliczania dla każdego miejsca.
+        Miejsca nieregularne (maska wielokąta) dostają pusty prostokąt - liczone są osobno.
+        """
+        n = len(self.car_park_positions)
+        xs, ys = np.zeros(n, dtype=np.int32), np.zeros(n, dtype=np.int32)
+        ws, hs = np.zeros(n, dtype=np.int32), np.zeros(n, dtype=np.int32)
+        for i, pos in enumerate(self.car_park_positions):
+            if isinstance(pos, dict):
+                if pos.get('irregular', False): continue
+                x_coords = [p[0] for p in pos['points']]
+                y_coords = [p[1] for p in pos['points']]
+                xs[i], ys[i] = min(x_coords), min(y_coords)
+                ws[i], hs[i] = max(x_coords) - xs[i], max(y_coords) - ys[i]
+            else:
+                xs[i], ys[i] = pos
+                ws[i], hs[i] = self.rect_width, self.rect_height
+        return xs, ys, ws, hs
+
+    def _build_spot_polygons(self) -> List[np.ndarray]:
+        """Wierzchołki każdego miejsca jako tablica int32 (N, 1, 2) gotowa dla OpenCV."""
+        polys = []
+        for pos in self.car_park_positions:
+            if isinstance(pos, dict):
+                points = pos['points']
+            else:
+                x, y = pos
+                points = [(x, y), (x + self.rect_width, y),
+                          (x + self.rect_width, y + self.rect_height), (x, y + self.rect_height)]
+            polys.append(np.asarray(points, dtype=np.int32).reshape(-1, 1, 2))
+        return polys
+
+    def _build_irregular_masks(self) -> Dict[int, np.ndarray]:
+        """Maski wielokątów nieregularnych o rozmiarze ich obrysu (x_min:x_max, y_min:y_max)."""
+        masks = {}
+        for i, pos in enumerate(self.car_park_positions):
+            if not (isinstance(pos, dict) and pos.get('irregular', False)): continue
+            pts = self._spot_pts[i].reshape(-1, 2)
+            (x_min, y_min), (x_max, y_max) = pts.min(axis=0), pts.max(axis=0)
+            mask = np.zeros((y_max - y_min, x_max - x_min), dtype=np.uint8)
+            cv2.fillPoly(mask, [(pts - (x_min, y_min)).astype(np.int32)], 255)
+            masks[i] = mask
+        return masks
+
+    def _build_roi_union(self) -> Optional[Tuple[int, int, int, int]]:
+        """Zwraca (x0, y0, x1, y1) prostokąta obejmującego wszystkie miejsca."""
+        xs, ys = [], []
+        for pos in self.car_park_positions:
+            if isinstance(pos, dict):
+                xs.extend(p[0] for p in pos['points'])
+                ys.extend(p[1] for p in pos['points'])
+            else:
+                x, y = pos
+                xs.extend((x, x + self.rect_width))
+                ys.extend((y, y + self.rect_height))
+        if not xs: return None
+        return min(xs), min(ys), max(xs), max(ys)
+
+    def _processing_margin(self) -> int:
+        """Zasięg (px), na jaki filtry potoku sięgają poza przetwarzany piksel."""
+        params = self.processing_params
+        return (max(params["gaussian_blur_kernel"]) // 2
+                + params["adaptive_threshold_block_size"] // 2
+                + params["median_blur_kernel"] // 2
+                + (max(params["dilate_kernel_size"]) // 2) * params["dilate_iterations"])
+
+    def implement_process_roi(self, image: np.ndarray) -> np.ndarray:
+        """
+        Jak implement_process, ale przetwarza tylko obszar miejsc (z marginesem filtrów).
+        Wewnątrz miejsc wynik jest identyczny, poza nimi obraz pozostaje wyzerowany.
+        Zwracany bufor jest współdzielony między klatkami.
+        """
+        if self._roi_union is None:
+            return self.implement_process(image)
+
+        img_h, img_w = image.shape[:2]
+        margin = self._processing_margin()
+        x0, y0, x1, y1 = self._roi_union
+        window = (max(0, y0 - margin), min(img_h, y1 + margin),
+                  max(0, x0 - margin), min(img_w, x1 + margin))
+        wy0, wy1, wx0, wx1 = window
+        if wy0 >= wy1 or wx0 >= wx1:
+            return self.implement_process(image)
+
+        if self._processed_buf is None or self._processed_buf.shape != (img_h, img_w):
+            self._processed_buf = np.zeros((img_h, img_w), dtype=np.uint8)
+        elif window != self._processed_window:
+            self._processed_buf.fill(0)
+        self._processed_window = window
+
+        self._processed_buf[wy0:wy1, wx0:wx1] = self.implement_process(image[wy0:wy1, wx0:wx1])
+        return self._processed_buf
+
     def implement_process(self, image: np.ndarray) -> np.ndarray:
         params = self.processing_params
         kernel_size = np.ones(tuple(params["dilate_kernel_size"]), np.uint8)
@@ -109,15 +224,14 @@ class ParkClassifier:
         occupied_spaces = 0
         space_details = []
 
-        # Sortowanie dla stabilności
-        sorted_positions = self.car_park_positions.copy()
-        def sort_key(pos):
-            raw_id = pos.get('id', '99999') 
-            try: return int(raw_id)
-            except: return 99999 
-        sorted_positions.sort(key=sort_key)
+        # Zliczanie pikseli wszystkich prostokątów jednym wywołaniem jądra Numba
+        use_kernel = NUMBA_AVAILABLE and len(self._roi_counts) > 0
+        if use_kernel:
+            count_nonzero_rois(processed_image, self._roi_xs, self._roi_ys,
+                               self._roi_ws, self._roi_hs, self._roi_counts)
 
-        for pos in sorted_positions:
+        for idx in self._sorted_order:
+            pos = self.car_park_positions[idx]
             spot_id_raw = pos.get('id')
             spot_id = str(spot_id_raw) if spot_id_raw is not None else '?'
 
@@ -130,22 +244,28 @@ class ParkClassifier:
                 y_min, y_max = min(y_coords), max(y_coords)
                 
                 if is_irregular:
-                    mask = np.zeros(processed_image.shape, dtype=np.uint8)
-                    pts = np.array(points, dtype=np.int32)
-                    cv2.fillPoly(mask, [pts], 255)
-                    crop = cv2.bitwise_and(processed_image[y_min:y_max, x_min:x_max], 
-                                        mask[y_min:y_max, x_min:x_max])
-                else:
                     crop = processed_image[y_min:y_max, x_min:x_max]
-                count = cv2.countNonZero(crop)
+                    local_mask = self._irregular_masks.get(idx)
+                    if local_mask is None or local_mask.shape != crop.shape:
+                        # Miejsce wychodzi poza klatkę - maska pełnoklatkowa jak dotąd
+                        local_mask = np.zeros(processed_image.shape, dtype=np.uint8)
+                        cv2.fillPoly(local_mask, [self._spot_pts[idx]], 255)
+                        local_mask = local_mask[y_min:y_max, x_min:x_max]
+                    count = cv2.countNonZero(cv2.bitwise_and(crop, local_mask))
+                elif use_kernel:
+                    count = int(self._roi_counts[idx])
+                else:
+                    count = cv2.countNonZero(processed_image[y_min:y_max, x_min:x_max])
             else:
                 # Backward compatibility
                 x, y = pos
                 points = [(x, y), (x + self.rect_width, y), 
                           (x + self.rect_width, y + self.rect_height), (x, y + self.rect_height)]
                 is_irregular = False
-                crop = processed_image[y:y + self.rect_height, x:x + self.rect_width]
-                count = cv2.countNonZero(crop)
+                if use_kernel:
+                    count = int(self._roi_counts[idx])
+                else:
+                    count = cv2.countNonZero(processed_image[y:y + self.rect_height, x:x + self.rect_width])
 
             # --- STABILIZATION LOGIC ---
             raw_is_empty = count < threshold
@@ -189,8 +309,7 @@ class ParkClassifier:
                 'pixel_count': count, 'is_empty': is_empty, 'irregular': is_irregular
             })
 
-            pts = np.array(points, dtype=np.int32)
-            cv2.polylines(image, [pts], True, color, thickness)
+            cv2.polylines(image, [self._spot_pts[idx]], True, color, thickness)
             center_x = sum(p[0] for p in points) // len(points)
             center_y = sum(p[1] for p in points) // len(points)
             cv2.putText(image, spot_id, (center_x - 10, center_y), 
@@ -0,0 +1,82 @@
+"""
+Wspólny odczyt i zapis plików pozycji miejsc parkingowych.
+
+Plik pozycji (bez rozszerzenia) zapisywany jest w układzie SoA jako archiwum
+NumPy (.npz): wszystkie wierzchołki w jednej tablicy 'pts' (K, 2), liczba
+wierzchołków każdego miejsca w 'lens', a także 'ids', 'irr' oraz 'route' (M, 2).
+Odczyt obsługuje też starsze pliki pickle: słownik
+{'car_park_positions': [...], 'route_points': [...]} lub samą listę miejsc.
+"""
+
+import os
+import pickle
+import numpy as np
+
+# Pliki .npz to archiwa ZIP - rozpoznajemy je po sygnaturze
+_NPZ_MAGIC = b'PK\x03\x04'
+
+
+def load_positions(path):
+    """
+    Wczytuje plik pozycji.
+
+    Returns:
+        tuple: (car_park_positions, route_points). Dla starego formatu trasa jest pusta.
+    """
+    with open(path, 'rb') as f:
+        if f.read(len(_NPZ_MAGIC)) == _NPZ_MAGIC:
+            f.seek(0)
+            return _load_npz(f)
+        f.seek(0)
+        data = pickle.load(f)
+    if isinstance(data, list):
+        return data, []
+    return data.get('car_park_positions', []), data.get('route_points', [])
+
+
+def _load_npz(f):
+    with np.load(f, allow_pickle=False) as npz:
+        pts, lens, ids, irr, route = npz['pts'], npz['lens'], npz['ids'], npz['irr'], npz['route']
+
+    offsets = np.concatenate(([0], np.cumsum(lens)))
+    positions = []
+    for i in range(len(lens)):
+        spot_pts = pts[offsets[i]:offsets[i + 1]]
+        positions.append({
+            'id': str(ids[i]),
+            'points': [tuple(p) for p in spot_pts.tolist()],
+            'irregular': bool(irr[i]),
+            # Gotowa tablica int32 dla kodu rysującego (klucze z '_' nie są zapisywane)
+            '_pts_np': spot_pts,
+        })
+    return positions, [tuple(p) for p in route.tolist()]
+
+
+def save_positions(path, car_park_positions, route_points):
+    """
+    Zapisuje miejsca i punkty trasy do pliku pozycji, tworząc brakujący katalog.
+    Zapis jest atomowy: plik tymczasowy obok docelowego zastępuje go przez os.replace,
+    więc przerwany zapis nie zostawia uszkodzonego pliku pozycji.
+    """
+    directory = os.path.dirname(path)
+    if directory:
+        os.makedirs(directory, exist_ok=True)
+    tmp_path = f"{path}.tmp"
+
+    if not all(isinstance(spot, dict) for spot in car_park_positions):
+        # Stary format (krotki zamiast słowników) nie ma odpowiednika SoA - zostaje pickle
+        with open(tmp_path, 'wb') as f:
+            pickle.dump({'car_park_positions': car_park_positions, 'route_points': route_points}, f)
+        os.replace(tmp_path, path)
+        return
+
+    # Klucze zaczynające się od '_' to dane podręczne liczone w pamięci - nie są zapisywane
+    lens = np.array([len(spot['points']) for spot in car_park_positions], dtype=np.int32)
+    pts = (np.array([p for spot in car_park_positions for p in spot['points']], dtype=np.int32).reshape(-1, 2))
+    ids = np.array([str(spot.get('id', '')) for spot in car_park_positions], dtype=str)
+    irr = np.array([bool(spot.get('irregular', False)) for spot in car_park_positions], dtype=bool)
+    route = np.array(route_points, dtype=np.int32).reshape(-1, 2)
+    # Obiekt pliku zamiast ścieżki - np.savez dopisałby rozszerzenie .npz
+    with open(tmp_path, 'wb') as f:
+        np.savez_compressed(f, pts=pts, lens=lens, ids=ids, irr=irr, route=route)
+    os.replace(tmp_path, path)
@@ -5,7 +5,7 @@ oraz interaktywnej konsoli systemowej wyświetlanej na klatkach wideo.
 """
 
 import os
-import glob
+import fnmatch
 import subprocess
 import sys
 import cv2
@@ -14,6 +14,7 @@ import time
 import math
 import re
 import textwrap
+import functools
 from PIL import Image, ImageDraw, ImageFont
 
 # Import biblioteki yt_dlp z obsługą błędu braku instalacji
@@ -31,13 +32,61 @@ if sys.platform.startswith('win'):
 
 IMG_DIR = os.path.join('data', 'source', 'img')
 
+@functools.lru_cache(maxsize=None)
+def get_screen_resolution():
+    """
+    Zwraca rozdzielczość ekranu (w, h). Wynik jest zapamiętywany po pierwszym wywołaniu.
+    Najpierw próbuje tanich wywołań systemowych, Tk jest tylko ostatecznością.
+    """
+    if sys.platform.startswith('win'):
+        try:
+            import ctypes
+            user32 = ctypes.windll.user32
+            w, h = user32.GetSystemMetrics(0), user32.GetSystemMetrics(1)
+            if w > 0 and h > 0: return w, h
+        except Exception: pass
+    elif os.environ.get('DISPLAY'):
+        try:
+            from Xlib import display as xdisplay
+            screen = xdisplay.Display().screen()
+            return screen.width_in_pixels, screen.height_in_pixels
+        except Exception: pass
+    try:
+        import tkinter as tk
+        root = tk.Tk(); root.withdraw()
+        w, h = root.winfo_screenwidth(), root.winfo_screenheight()
+        root.destroy(); return w, h
+    except Exception: return 1920, 1080
+
+@functools.lru_cache(maxsize=None)
+def _get_pl_font(f_size):
+    """Czcionka z polskimi znakami dla danego rozmiaru (wczytywana raz)."""
+    if sys.platform.startswith('win'):
+        f_path = os.path.join(os.environ.get('WINDIR', 'C:\\Windows'), 'Fonts', 'arial.ttf')
+        if os.path.exists(f_path):
+            try: return ImageFont.truetype(f_path, f_size)
+            except: pass
+    return ImageFont.load_default()
+
+@functools.lru_cache(maxsize=256)
+def _text_sprite(text, f_size):
+    """
+    Rasteryzuje tekst raz do maski krycia (float32, wymiary h x w x 1).
+    Kolor nakładany jest dopiero przy blitowaniu, więc klucz nie zawiera koloru.
+    """
+    font = _get_pl_font(f_size)
+    _, _, right, bottom = font.getbbox(text)
+    mask = Image.new('L', (max(int(right), 1), max(int(bottom), 1)), 0)
+    ImageDraw.Draw(mask).text((0, 0), text, font=font, fill=255)
+    return (np.asarray(mask, dtype=np.float32) / 255.0)[:, :, None]
+
 def draw_text_pl(img, text, pos, font_scale, color, thickness=1):
     """Renderuje tekst z ujednoliconym pozycjonowaniem dla CV2 i PIL."""
     x, y = int(pos[0]), int(pos[1])
     if isinstance(color, int): 
-        bgr_color = (color, color, color); rgb_color = (color, color, color)
+        bgr_color = (color, color, color)
     else: 
-        bgr_color = color; rgb_color = (color[2], color[1], color[0])
+        bgr_color = color
 
     pl_chars = 'ąęćłńóśźżĄĘĆŁŃÓŚŹŻ'
     has_pl = any(char in text for char in pl_chars)
@@ -47,45 +96,100 @@ def draw_text_pl(img, text, pos, font_scale, color, thickness=1):
         cv2.putText(img, text, (x, y + cv2_y_offset), cv2.FONT_HERSHEY_SIMPLEX, font_scale, bgr_color, thickness)
         return img
     try:
-        img_pil = Image.fromarray(cv2.cvtColor(img, cv2.COLOR_BGR2RGB))
-        draw = ImageDraw.Draw(img_pil)
-        f_size = int(font_scale * 30)
-        font = None
-        if sys.platform.startswith('win'):
-            f_path = os.path.join(os.environ.get('WINDIR', 'C:\\Windows'), 'Fonts', 'arial.ttf')
-            if os.path.exists(f_path):
-                try: font = ImageFont.truetype(f_path, f_size)
-                except: pass
-        if font is None: font = ImageFont.load_default()
+        # Tekst rasteryzowany raz (PIL) i nakładany na fragment klatki, zamiast
+        # konwersji całej klatki BGR -> PIL -> BGR przy każdym wywołaniu
+        alpha = _text_sprite(text, int(font_scale * 30))
         # Korekta pionowa dla PIL
-        draw.text((x, y + (cv2_y_offset // 5)), text, font=font, fill=rgb_color)
-        return cv2.cvtColor(np.array(img_pil), cv2.COLOR_RGB2BGR)
+        ty = y + (cv2_y_offset // 5)
+        h_i, w_i = img.shape[:2]
+        x0, y0 = max(x, 0), max(ty, 0)
+        x1, y1 = min(x + alpha.shape[1], w_i), min(ty + alpha.shape[0], h_i)
+        if x0 >= x1 or y0 >= y1: return img
+        a = alpha[y0 - ty:y1 - ty, x0 - x:x1 - x]
+        roi = img[y0:y1, x0:x1]
+        roi[:] = (roi * (1.0 - a) + np.asarray(bgr_color, dtype=np.float32) * a + 0.5).astype(img.dtype)
+        return img
     except:
         cv2.putText(img, text, (x, y + cv2_y_offset), cv2.FONT_HERSHEY_SIMPLEX, font_scale, bgr_color, thickness)
         return img
 
+_blend_scratch = {}
+
+def blend_rects(frame, rects, alpha):
+    """
+    Rysuje półprzezroczyste prostokąty ((x0, y0), (x1, y1), kolor, grubość) w miejscu.
+    Mieszanie (addWeighted) obejmuje tylko obszar otaczający prostokąty, nie całą klatkę.
+    """
+    h_f, w_f = frame.shape[:2]
+    bx0 = max(0, min(min(p0[0], p1[0]) for p0, p1, _, _ in rects))
+    by0 = max(0, min(min(p0[1], p1[1]) for p0, p1, _, _ in rects))
+    bx1 = min(w_f, max(max(p0[0], p1[0]) for p0, p1, _, _ in rects) + 1)
+    by1 = min(h_f, max(max(p0[1], p1[1]) for p0, p1, _, _ in rects) + 1)
+    if bx0 >= bx1 or by0 >= by1: return frame
+
+    roi = frame[by0:by1, bx0:bx1]
+    # Bufor roboczy współdzielony między wywołaniami - rośnie tylko, gdy obszar jest większy
+    scratch = _blend_scratch.get(frame.dtype)
+    if scratch is None or scratch.shape[0] < roi.shape[0] or scratch.shape[1] < roi.shape[1] or scratch.shape[2:] != roi.shape[2:]:
+        h_s = max(roi.shape[0], scratch.shape[0] if scratch is not None else 0)
+        w_s = max(roi.shape[1], scratch.shape[1] if scratch is not None else 0)
+        scratch = _blend_scratch[frame.dtype] = np.empty((h_s, w_s) + roi.shape[2:], dtype=frame.dtype)
+    ov = scratch[:roi.shape[0], :roi.shape[1]]
+    np.copyto(ov, roi)
+    for (x0, y0), (x1, y1), color, thickness in rects:
+        cv2.rectangle(ov, (x0 - bx0, y0 - by0), (x1 - bx0, y1 - by0), color, thickness)
+    cv2.addWeighted(ov, alpha, roi, 1.0 - alpha, 0, dst=roi)
+    return frame
+
+# Posortowane listy plików: (folder, wzorzec) -> (mtime_ns folderu, ścieżki, nazwy)
+_dir_listing_cache = {}
+
+@functools.lru_cache(maxsize=32)
+def _name_matcher(pattern):
+    """
+    Zwraca funkcję dopasowania nazwy pliku do wzorca glob. Wzorce typu '*.png'
+    sprawdzane są porównaniem końcówki, pozostałe skompilowanym wyrażeniem regularnym.
+    """
+    # normcase: na Windows dopasowanie bez rozróżniania wielkości liter (jak glob), na POSIX bez zmian
+    pattern = os.path.normcase(pattern)
+    suffix = pattern[1:]
+    if pattern.startswith('*') and not any(ch in suffix for ch in '*?['):
+        return lambda name: os.path.normcase(name).endswith(suffix)
+    regex = re.compile(fnmatch.translate(pattern))
+    return lambda name: regex.match(os.path.normcase(name)) is not None
+
 def list_files_three_columns(folder, pattern='*.png', cols=3):
     """
     Wyświetla listę plików z folderu w trzech kolumnach w terminalu.
+    Lista jest zapamiętywana do czasu zmiany folderu (jeden stat zamiast skanowania).
     """
-    files = sorted(glob.glob(os.path.join(folder, pattern)))
+    try:
+        mtime = os.stat(folder).st_mtime_ns
+    except OSError:
+        return []
+    cached = _dir_listing_cache.get((folder, pattern))
+    if cached is not None and cached[0] == mtime:
+        _, files, names = cached
+    else:
+        # Jeden przebieg scandir - DirEntry zna nazwę i typ wpisu bez osobnych wywołań stat,
+        # a e.name to gotowa nazwa pliku (bez os.path.basename na każdą ścieżkę)
+        matches = _name_matcher(pattern)
+        with os.scandir(folder) as it:
+            entries = sorted((e.name, e.path) for e in it if matches(e.name) and e.is_file())
+        names = [name for name, _ in entries]
+        files = [path for _, path in entries]
+        _dir_listing_cache[(folder, pattern)] = (mtime, files, names)
     if not files: 
         return []
-    names = [os.path.basename(p) for p in files]
     rows = math.ceil(len(names) / cols)
-    
+    # Szerokość kolumny: najdłuższa nazwa + zapas na numer '[NN] '
+    width = max(map(len, names)) + 4
+    items = ['[{:2d}] {}'.format(i + 1, n).ljust(width) for i, n in enumerate(names)]
+
     print('\nAvailable files:')
-    max_n = max(len(n) for n in names) if names else 0
-
-    for r in range(rows):
-        row_str = ''
-        for c in range(cols):
-            idx = r + c * rows
-            if idx < len(names): 
-                item = '[{:2d}] {}'.format(idx+1, names[idx])
-                row_str += item.ljust(max_n + 4)
-        print(row_str)
-    return files
+    # Numeracja biegnie kolumnami, więc wiersz r to co `rows`-ty element od r
+    print('\n'.join(''.join(items[r::rows]) for r in range(rows)))
+    return list(files)
 
 def get_direct_youtube_url(youtube_url):
     """
@@ -159,6 +263,8 @@ class OverlayConsole:
         self.current_rect = None 
         self.cwd = os.getcwd().replace('\\', '/')
         self.line_limit = 50
+        # Licznik zmian stanu - pozwala pętlom UI przerysowywać tylko gdy trzeba
+        self.revision = 0
         
         if log_file:
             try:
@@ -208,12 +314,16 @@ class OverlayConsole:
                     self.buffer.pop(0)
             
             self.scroll_offset = 0
+            self.revision += 1
             
     def flush(self): pass
-    def toggle(self): self.visible = not self.visible
+    def toggle(self):
+        self.visible = not self.visible
+        self.revision += 1
     def clear(self):
         self.buffer = []
         self.scroll_offset = 0
+        self.revision += 1
 
     def handle_mouse(self, event, x, y, flags, param=None):
         if not self.visible: return False
@@ -236,6 +346,7 @@ class OverlayConsole:
                         self.scroll_offset = min(self.scroll_offset + 2, total - max_v)
                     else: # W dół (do nowych)
                         self.scroll_offset = max(0, self.scroll_offset - 2)
+                    self.revision += 1
                     return True 
                 
                 elif event == cv2.EVENT_LBUTTONDOWN and self.btn_clear_rect:
@@ -254,10 +365,8 @@ class OverlayConsole:
         start_x, start_y = max(0, w_f - self.width - 10), 60 
         self.current_rect = (start_x, start_y, self.width, self.height)
         
-        ov = frame.copy()
-        cv2.rectangle(ov, (start_x, start_y), (start_x + self.width, start_y + self.height), self.bg_color, -1)
-        cv2.rectangle(ov, (start_x, start_y), (start_x + self.width, start_y + 30), (40, 40, 40), -1)
-        frame = cv2.addWeighted(ov, 0.8, frame, 0.2, 0)
+        blend_rects(frame, [((start_x, start_y), (start_x + self.width, start_y + self.height), self.bg_color, -1),
+                            ((start_x, start_y), (start_x + self.width, start_y + 30), (40, 40, 40), -1)], 0.8)
         cv2.putText(frame, self.title, (start_x + 10, start_y + 20), cv2.FONT_HERSHEY_SIMPLEX, 0.5, (255, 255, 255), 1)
 
         l_h = 22
@@ -0,0 +1,5 @@
+import os
+import sys
+
+# Testy importują moduły projektu tak jak skrypty: `from src.kernels import ...`
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
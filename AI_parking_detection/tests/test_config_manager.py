@@ -0,0 +1,30 @@
+import json
+
+from src.config_manager import ConfigManager
+
+
+def _write_config(tmp_path):
+    path = tmp_path / "parking_config.json"
+    path.write_text(json.dumps({
+        "parking_lots": {"default": {"name": "Default", "threshold": 900, "rect_size": [107, 48]}},
+        "processing_params": {"gaussian_blur_kernel": [3, 3], "dilate_kernel_size": [3, 3]},
+    }), encoding="utf-8")
+    return str(path)
+
+
+def test_nested_processing_params_are_not_shared_between_instances(tmp_path):
+    path = _write_config(tmp_path)
+    params = ConfigManager(path).get_processing_params()
+    params["gaussian_blur_kernel"][0] = 99
+    params["dilate_kernel_size"].append(7)
+
+    fresh = ConfigManager(path).get_processing_params()
+    assert fresh["gaussian_blur_kernel"] == [3, 3]
+    assert fresh["dilate_kernel_size"] == [3, 3]
+
+
+def test_nested_lot_config_is_not_shared_between_instances(tmp_path):
+    path = _write_config(tmp_path)
+    ConfigManager(path).get_parking_lot_config("default")["rect_size"][0] = 1
+
+    assert ConfigManager(path).get_parking_lot_config("default")["rect_size"] == [107, 48]
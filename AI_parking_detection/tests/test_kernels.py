@@ -0,0 +1,32 @@
+import pytest
+
+np = pytest.importorskip("numpy")
+
+from src.kernels import find_spot, points_in_polygons
+
+# Kwadrat 10 x 10 oraz drugi, przesunięty w prawo - oba po 4 wierzchołki
+SQUARES = np.array([[(0, 0), (10, 0), (10, 10), (0, 10)],
+                    [(20, 0), (30, 0), (30, 10), (20, 10)]], dtype=np.float64)
+# Te same kwadraty w formacie find_spot: płaski bufor (x0, y0, x1, y1, ...) i przesunięcia
+SQUARES_FLAT = SQUARES.reshape(-1).astype(np.float32)
+SQUARES_OFFSETS = np.array([0, 4, 8], dtype=np.int32)
+
+
+@pytest.mark.parametrize("px, py", [(5, 5), (10, 5), (5, 10), (10, 10), (0, 5), (5, 0)])
+def test_points_in_polygons_counts_interior_and_every_edge(px, py):
+    assert points_in_polygons(px, py, SQUARES).tolist() == [True, False]
+
+
+@pytest.mark.parametrize("px, py", [(11, 5), (5, 11), (15, 5), (-1, -1)])
+def test_points_in_polygons_rejects_outside_points(px, py):
+    assert points_in_polygons(px, py, SQUARES).tolist() == [False, False]
+
+
+def test_points_in_polygons_right_edge_of_second_spot():
+    assert points_in_polygons(30, 5, SQUARES).tolist() == [False, True]
+
+
+@pytest.mark.parametrize("px, py, expected", [(5, 5, 0), (10, 5, 0), (5, 10, 0), (10, 10, 0),
+                                              (30, 5, 1), (25, 10, 1), (11, 5, -1), (15, 5, -1)])
+def test_find_spot_includes_right_and_bottom_edges(px, py, expected):
+    assert find_spot(np.float32(px), np.float32(py), SQUARES_FLAT, SQUARES_OFFSETS) == expected